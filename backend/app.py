@@ -5,16 +5,28 @@ Production-ready FastAPI application for Render deployment
 
 from dotenv import load_dotenv
 import os
+import re
+import time
+import asyncio
 import logging
+import orjson
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
 
 # Load environment variables
 load_dotenv()
 
+# Read once at import; request handlers reference these constants
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production")
+IS_DEV = ENVIRONMENT == "development"
+PORT = os.getenv("PORT", "8000")
+SUPABASE_URL = os.getenv("SUPABASE_URL", "not_set")
+HF_TOKEN = os.getenv("HF_TOKEN")
+DOCS_ENABLED = IS_DEV  # Swagger/ReDoc/OpenAPI routes are only registered in development
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,8 +36,24 @@ logger = logging.getLogger(__name__)
 
 # Import routes (after env loading)
 from routes import auth, transactions, ai, telegram, monitoring
-from config import Config, get_supabase, get_user_id
+from config import Config, supabase_client, get_user_id, close_supabase_clients
 from services.scheduler_service import initialize_scheduler, stop_scheduler
+from services.transaction_writer import start_transaction_writer, stop_transaction_writer
+from db.pool import init_pool, close_pool
+from services.hf_client import close_hf_clients
+from services.telegram_client import close_telegram_client
+from middleware.fast_cors import FastCORSMiddleware
+from middleware.errors import ErrorASGIMiddleware
+from middleware.health import HealthFastPathMiddleware
+
+# Bound once at import; the health endpoints only reference these names
+try:
+    from services.opik_service import OPIK_AVAILABLE, check_opik_health
+except Exception:
+    OPIK_AVAILABLE = False
+
+    def check_opik_health():
+        return {"enabled": False}
 
 # ==================== APP LIFESPAN ====================
 
@@ -34,33 +62,58 @@ async def lifespan(app: FastAPI):
     """Manage application startup and shutdown."""
     # Startup
     logger.info("🚀 Sentinel Backend starting up...")
-    logger.info(f"   Environment: {os.getenv('ENVIRONMENT', 'production')}")
-    logger.info(f"   Port: {os.getenv('PORT', '8000')}")
+    logger.info("=" * 50)
+    logger.info("🎯 Sentinel Backend - AI Financial Tracker")
+    logger.info("=" * 50)
+    logger.info("Environment: %s", ENVIRONMENT)
+    logger.info("Port: %s", PORT)
+    logger.info("Docs: %s", "/api/docs" if DOCS_ENABLED else "disabled")
+    logger.info("Health: /api/health")
+    logger.info("=" * 50)
     
     try:
         # Initialize scheduler for periodic tasks
         initialize_scheduler()
         logger.info("✅ Scheduler initialized")
     except Exception as e:
-        logger.error(f"⚠️ Scheduler initialization failed: {e}")
+        logger.error("⚠️ Scheduler initialization failed: %s", e)
+    
+    # Telegram expense inserts are coalesced into bulk writes
+    start_transaction_writer()
     
     # Check critical services
     try:
-        supabase = get_supabase()
+        supabase = supabase_client()
         logger.info("✅ Database connection verified")
     except Exception as e:
-        logger.error(f"❌ Database connection failed: {e}")
+        logger.error("❌ Database connection failed: %s", e)
+    
+    # Open the Postgres pool used by the transaction routes
+    await init_pool()
+    
+    # Resolve the tesseract version once; it shells out to `tesseract --version`.
+    # pytesseract is only imported here, so loading app.py does not pull it in.
+    try:
+        import pytesseract
+        app.state.tesseract_version = str(pytesseract.get_tesseract_version())
+        app.state.tesseract_error = None
+    except Exception as e:
+        app.state.tesseract_version = None
+        app.state.tesseract_error = str(e)
+    
+    # Probe the database in the background; /api/health only reads the result
+    _db_status["ts"] = time.monotonic()
+    db_probe_task = asyncio.create_task(_probe_database())
     
     # Check Opik monitoring
     try:
-        from services.opik_monitoring import check_opik_health
         opik_health = check_opik_health()
         if opik_health['enabled']:
-            logger.info(f"✅ Opik monitoring enabled ({opik_health.get('mode', 'unknown')} mode)")
+            logger.info("✅ Opik monitoring enabled (%s mode)", opik_health.get('mode', 'unknown'))
         else:
             logger.warning("⚠️ Opik monitoring disabled")
     except Exception as e:
-        logger.warning(f"⚠️ Opik monitoring check failed: {e}")
+        logger.warning("⚠️ Opik monitoring check failed: %s", e)
     
     logger.info("✅ Backend startup complete!")
     
@@ -68,11 +121,17 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Sentinel Backend shutting down...")
+    db_probe_task.cancel()
+    await stop_transaction_writer()
+    await close_hf_clients()
+    await close_telegram_client()
+    await close_supabase_clients()
+    await close_pool()
     try:
         stop_scheduler()
         logger.info("✅ Scheduler stopped")
     except Exception as e:
-        logger.error(f"⚠️ Scheduler shutdown error: {e}")
+        logger.error("⚠️ Scheduler shutdown error: %s", e)
     
     logger.info("✅ Backend shutdown complete")
 
@@ -84,8 +143,10 @@ app = FastAPI(
     description="AI-powered Financial Smoke Detector with OCR and LLM Monitoring",
     version="1.0.0",
     lifespan=lifespan,
-    docs_url="/api/docs",  # Swagger UI
-    redoc_url="/api/redoc",  # ReDoc
+    default_response_class=ORJSONResponse,  # orjson instead of stdlib json for every route
+    docs_url="/api/docs" if DOCS_ENABLED else None,  # Swagger UI
+    redoc_url="/api/redoc" if DOCS_ENABLED else None,  # ReDoc
+    openapi_url="/api/openapi.json" if DOCS_ENABLED else None,
 )
 
 # ==================== CORS MIDDLEWARE ====================
@@ -98,80 +159,151 @@ allowed_origins = Config.ALLOWED_ORIGINS if hasattr(Config, 'ALLOWED_ORIGINS') e
     "https://*.onrender.com",  # Allow all Render subdomains
 ]
 
-# Add environment-specific origins
+# Add environment-specific origins (dict.fromkeys dedupes without mutating Config)
 frontend_url = os.getenv("FRONTEND_URL")
-if frontend_url and frontend_url not in allowed_origins:
-    allowed_origins.append(frontend_url)
+allowed_origins = list(dict.fromkeys(allowed_origins + [frontend_url] if frontend_url else allowed_origins))
+
+# Exact origins are matched by set lookup; wildcard entries such as
+# "https://*.onrender.com" are folded into a single precompiled regex
+exact_origins = frozenset(o for o in allowed_origins if "*" not in o)
+regex_origins = [re.escape(o).replace(r"\*", r"[^/]+") for o in allowed_origins if "*" in o]
+origin_regex = "|".join(f"({r})" for r in regex_origins) or None
 
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allowed_origins,
+    FastCORSMiddleware,
+    allow_origins=exact_origins,
+    allow_origin_regex=origin_regex,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Explicit lists let the Allow-Methods/Allow-Headers values be built once
+    # instead of reflecting the request headers on every preflight
+    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
+    allow_headers=["authorization", "content-type", "x-requested-with"],
     expose_headers=["*"],
 )
 
-logger.info(f"📡 CORS enabled for origins: {allowed_origins}")
+logger.info("📡 CORS enabled for origins: %s", allowed_origins)
+
+# ==================== COMPRESSION ====================
+
+# Compress JSON bodies of 1KB or more (status, transaction lists); level 5
+# keeps most of the size win at a fraction of level 9's CPU cost
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 # ==================== HEALTH CHECK ENDPOINTS ====================
 
+# The root payload is constant, so it is serialized once and the same
+# Response (which holds no per-request state) is returned on every hit
+_ROOT_BODY = orjson.dumps({
+    "service": "Sentinel Backend",
+    "status": "running",
+    "version": "1.0.0",
+    "docs": "/api/docs" if DOCS_ENABLED else None,
+    "health": "/api/health"
+})
+_ROOT_RESPONSE = Response(content=_ROOT_BODY, media_type="application/json")
+
+
 @app.get("/")
 async def root():
     """Root endpoint - API status."""
-    return {
-        "service": "Sentinel Backend",
-        "status": "running",
-        "version": "1.0.0",
-        "docs": "/api/docs",
-        "health": "/api/health"
-    }
+    return _ROOT_RESPONSE
 
 
-@app.get("/api/health")
-async def health_check():
-    """Health check endpoint for monitoring and Render."""
+# Probe results are memoized for a TTL shorter than the probe interval; the lock
+# makes concurrent probes wait for a single refresh instead of stampeding.
+HEALTH_CACHE_TTL = 5
+STATUS_CACHE_TTL = 30
+
+_health_cache = {"t": 0.0, "body": None}
+_status_cache = {"t": 0.0, "body": None}
+_health_lock = asyncio.Lock()
+_status_lock = asyncio.Lock()
+
+
+async def _cached_json(cache: dict, ttl: float, lock: asyncio.Lock, build) -> Response:
+    """Return the cached JSON body for an endpoint, rebuilding it once per TTL."""
+    if cache["body"] is not None and time.monotonic() - cache["t"] < ttl:
+        return Response(content=cache["body"], media_type="application/json")
+    async with lock:
+        if cache["body"] is None or time.monotonic() - cache["t"] >= ttl:
+            cache["body"] = orjson.dumps(build())
+            cache["t"] = time.monotonic()
+    return Response(content=cache["body"], media_type="application/json")
+
+
+# Database reachability is refreshed by a background task started in lifespan,
+# so a health probe is a dict lookup rather than a Supabase call.
+DB_PROBE_INTERVAL = 15
+DB_PROBE_TIMEOUT = 2
+DB_STATUS_MAX_AGE = 60
+
+_db_status = {"ok": True, "ts": 0.0}
+
+
+def _ping_database():
+    supabase_client().table("user_profiles").select("id").limit(1).execute()
+
+
+async def _probe_database():
+    """Run a time-bounded query against the database every DB_PROBE_INTERVAL seconds."""
+    while True:
+        try:
+            await asyncio.wait_for(asyncio.to_thread(_ping_database), DB_PROBE_TIMEOUT)
+            _db_status["ok"] = True
+        except Exception as e:
+            if _db_status["ok"]:
+                logger.error("Database health check failed: %r", e)
+            _db_status["ok"] = False
+        _db_status["ts"] = time.monotonic()
+        await asyncio.sleep(DB_PROBE_INTERVAL)
+
+
+def _build_health_status() -> dict:
     health_status = {
         "status": "ok",
         "message": "Backend is running",
-        "environment": os.getenv("ENVIRONMENT", "production"),
+        "environment": ENVIRONMENT,
     }
     
-    # Check database
-    try:
-        supabase = get_supabase()
+    # Database status from the last background probe
+    if _db_status["ok"]:
         health_status["database"] = "connected"
-    except Exception as e:
-        logger.error(f"Database health check failed: {e}")
+    else:
         health_status["database"] = "error"
         health_status["status"] = "degraded"
     
     # Check Opik monitoring
-    try:
-        from services.opik_monitoring import OPIK_AVAILABLE
-        health_status["monitoring"] = "enabled" if OPIK_AVAILABLE else "disabled"
-    except Exception:
-        health_status["monitoring"] = "unavailable"
+    health_status["monitoring"] = "enabled" if OPIK_AVAILABLE else "disabled"
     
     return health_status
 
 
-@app.get("/api/status")
-async def detailed_status():
-    """Detailed status endpoint for debugging."""
+@app.get("/api/health")
+async def health_check():
+    """Health check endpoint for monitoring and Render."""
+    if time.monotonic() - _db_status["ts"] > DB_STATUS_MAX_AGE:
+        # The probe task has stalled, so the cached database state can't be trusted
+        return ORJSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "message": "Database status is stale"}
+        )
+    return await _cached_json(_health_cache, HEALTH_CACHE_TTL, _health_lock, _build_health_status)
+
+
+def _build_detailed_status() -> dict:
     status = {
         "service": "Sentinel Backend",
         "version": "1.0.0",
-        "environment": os.getenv("ENVIRONMENT", "production"),
-        "port": os.getenv("PORT", "8000"),
+        "environment": ENVIRONMENT,
+        "port": PORT,
     }
     
     # Database status
     try:
-        supabase = get_supabase()
+        supabase = supabase_client()
         status["database"] = {
             "status": "connected",
-            "url": os.getenv("SUPABASE_URL", "not_set")[:30] + "..."
+            "url": SUPABASE_URL[:30] + "..."
         }
     except Exception as e:
         status["database"] = {
@@ -181,7 +313,6 @@ async def detailed_status():
     
     # Opik monitoring status
     try:
-        from services.opik_monitoring import check_opik_health
         status["monitoring"] = check_opik_health()
     except Exception as e:
         status["monitoring"] = {
@@ -189,29 +320,34 @@ async def detailed_status():
             "error": str(e)
         }
     
-    # OCR status
-    try:
-        import pytesseract
-        version = pytesseract.get_tesseract_version()
+    # OCR status (resolved once at startup)
+    tesseract_version = getattr(app.state, "tesseract_version", None)
+    if tesseract_version:
         status["ocr"] = {
             "status": "available",
-            "tesseract_version": str(version)
+            "tesseract_version": tesseract_version
         }
-    except Exception as e:
+    else:
         status["ocr"] = {
             "status": "unavailable",
-            "error": str(e)
+            "error": getattr(app.state, "tesseract_error", None) or "tesseract not checked"
         }
     
     # AI models status
     status["ai_models"] = {
-        "huggingface_token": "configured" if os.getenv("HF_TOKEN") else "missing",
+        "huggingface_token": "configured" if HF_TOKEN else "missing",
         "qwen_model": "Qwen2.5-7B-Instruct"
     }
     
     return status
 
 
+@app.get("/api/status")
+async def detailed_status():
+    """Detailed status endpoint for debugging."""
+    return await _cached_json(_status_cache, STATUS_CACHE_TTL, _status_lock, _build_detailed_status)
+
+
 # ==================== ROUTE REGISTRATION ====================
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
@@ -224,11 +360,21 @@ logger.info("✅ All routes registered")
 
 # ==================== ERROR HANDLING ====================
 
+# Unhandled exceptions are answered by a pure-ASGI wrapper (no Request objects).
+# HTTPException raised inside routes is always caught first by Starlette's
+# ExceptionMiddleware, so its handler stays registered and serializes with orjson.
+app.add_middleware(ErrorASGIMiddleware, debug=IS_DEV)
+
+# Registered last so it is outermost: HEAD liveness pings on /api/health are
+# answered before CORS, error handling or routing run
+app.add_middleware(HealthFastPathMiddleware)
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions."""
-    logger.error(f"HTTP Exception: {exc.status_code} - {exc.detail}")
-    return JSONResponse(
+    logger.error("HTTP Exception: %s - %s", exc.status_code, exc.detail)
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
@@ -238,51 +384,30 @@ async def http_exception_handler(request, exc):
     )
 
 
-@app.exception_handler(Exception)
-async def general_exception_handler(request, exc):
-    """Handle general exceptions."""
-    logger.error(f"Unhandled Exception: {exc}", exc_info=True)
-    return JSONResponse(
-        status_code=500,
-        content={
-            "error": "Internal server error",
-            "message": str(exc) if os.getenv("ENVIRONMENT") == "development" else "An error occurred",
-            "status_code": 500
-        }
-    )
-
-
-# ==================== STARTUP INFO ====================
-
-@app.on_event("startup")
-async def log_startup_info():
-    """Log startup information."""
-    logger.info("=" * 50)
-    logger.info("🎯 Sentinel Backend - AI Financial Tracker")
-    logger.info("=" * 50)
-    logger.info(f"Environment: {os.getenv('ENVIRONMENT', 'production')}")
-    logger.info(f"Port: {os.getenv('PORT', '8000')}")
-    logger.info(f"Docs: /api/docs")
-    logger.info(f"Health: /api/health")
-    logger.info("=" * 50)
-
-
 # ==================== MAIN ENTRY POINT ====================
 
 if __name__ == "__main__":
     # Get port from environment (Render sets this)
     port = int(os.getenv("PORT", 8000))
     
+    # `python app.py` is a local entry point, so here an unset ENVIRONMENT means
+    # dev (loopback + reload), unlike the module-level default of "production"
+    # that applies when gunicorn imports the app
+    is_production = os.getenv("ENVIRONMENT") == "production"
+    
     # Get host (0.0.0.0 for Render, localhost for local dev)
-    host = "0.0.0.0" if os.getenv("ENVIRONMENT") == "production" else "127.0.0.1"
+    host = "0.0.0.0" if is_production else "127.0.0.1"
     
-    logger.info(f"Starting server on {host}:{port}")
+    logger.info("Starting server on %s:%s", host, port)
     
     uvicorn.run(
-        "main:app",  # Use string reference for auto-reload
+        "app:app",  # Use string reference for auto-reload / multiple workers
         host=host,
         port=port,
-        log_level="info",
-        reload=os.getenv("ENVIRONMENT") != "production",  # Disable reload in production
-        workers=1  # Single worker for free tier
-    )
\ No newline at end of file
+        loop="uvloop",  # libuv event loop (shipped with uvicorn[standard])
+        http="httptools",  # C HTTP parser
+        log_level="warning",
+        access_log=False,  # Skip per-request access log formatting
+        reload=not is_production,  # Disable reload in production
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))  # 1 on free tier, raise on paid plans
+    )
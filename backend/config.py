@@ -5,6 +5,7 @@ import os
 from dotenv import load_dotenv
 from fastapi import HTTPException, Header
 from typing import Optional
+from functools import lru_cache
 import logging
 import ssl
 
@@ -13,105 +14,187 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Read once at import instead of per request
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production")
+IS_DEV = ENVIRONMENT == "development"
+
 # ==================== SUPABASE CLIENTS ====================
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_KEY")  # Anon key for client
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # Service role for server
 
-supabase_client: Optional[object] = None
-supabase_service_client: Optional[object] = None
 
-if SUPABASE_URL and SUPABASE_ANON_KEY:
-    try:
-        from supabase import create_client, Client
-        
-        # Anon key client (respects RLS)
-        supabase_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        logger.info(f"Supabase anon client initialized: {SUPABASE_URL}")
-    except Exception as e:
-        logger.error(f"Failed to initialize Supabase anon client: {e}")
-        supabase_client = None
-else:
+@lru_cache(maxsize=2)  # one entry each for the anon and service role keys
+def _build_supabase(url: str, key: str):
+    """
+    Create a Supabase client once per (url, key) and reuse it afterwards.
+    Clients are built on the first supabase_client()/get_supabase_admin() call
+    rather than at import, keeping client setup off the module import path.
+    """
+    from supabase import create_client
+    client = create_client(url, key)
+    logger.info("Supabase client initialized: %s", url)
+    return client
+
+
+if not (SUPABASE_URL and SUPABASE_ANON_KEY):
     logger.warning("Supabase anon credentials not configured. Set SUPABASE_URL and SUPABASE_KEY")
 
-# Service role client (bypasses RLS for server operations)
-if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
-    try:
-        from supabase import create_client
-        supabase_service_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-        logger.info(f"Supabase service role client initialized")
-    except Exception as e:
-        logger.error(f"Failed to initialize Supabase service role client: {e}")
-        supabase_service_client = None
-else:
+if not (SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY):
     logger.warning("Supabase service role key not configured. Set SUPABASE_SERVICE_ROLE_KEY for backend operations")
 
 # ==================== DEPENDENCIES ====================
 
-def get_supabase():
+def supabase_client():
     """Get Supabase client (anon key - respects RLS)"""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    if not url or not key:
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
         raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
-    from supabase import create_client
-    return create_client(url, key)
+    return _build_supabase(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+async def get_supabase():
+    """
+    FastAPI dependency for the anon Supabase client.
+    Declared async so FastAPI resolves it on the event loop instead of
+    dispatching a threadpool hop per request; code outside a request
+    (scheduler, background tasks) calls supabase_client() directly.
+    """
+    return supabase_client()
 
 def get_supabase_admin():
     """Get Supabase admin client (service role - bypasses RLS)"""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not url or not key:
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         logger.warning("Service role key not configured, falling back to anon client")
-        return get_supabase()
-    from supabase import create_client
-    return create_client(url, key)
+        return supabase_client()
+    return _build_supabase(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+# Async clients (supabase AsyncClient): awaited PostgREST/GoTrue calls that
+# free the event loop during network I/O. Used by the auth routes.
+_async_clients: dict = {}
 
-async def get_user_id(authorization: str = Header(None)) -> str:
+async def _build_supabase_async(url: str, key: str):
+    """
+    Create an async Supabase client once per (url, key) and reuse it afterwards.
+    Each cached client keeps its own keep-alive pool; pools are deliberately
+    not shared across keys, since postgrest-py writes the apikey/Authorization
+    headers onto the httpx client it is handed.
     """
-    Extract user ID from JWT token in Authorization header.
-    Expected format: "Bearer <jwt_token>"
+    client = _async_clients.get((url, key))
+    if client is None:
+        from supabase import acreate_client
+        client = _async_clients[(url, key)] = await acreate_client(url, key)
+        logger.info("Async Supabase client initialized: %s", url)
+    return client
+
+async def close_supabase_clients():
+    """Close the cached async clients' PostgREST connection pools on shutdown."""
+    for client in _async_clients.values():
+        try:
+            await client.postgrest.aclose()
+        except Exception as e:
+            logger.warning("Error closing Supabase client: %s", e)
+    _async_clients.clear()
+
+async def get_supabase_async():
+    """Get async Supabase client (anon key - respects RLS)"""
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
+    return await _build_supabase_async(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+async def get_supabase_admin_async():
+    """Get async Supabase admin client (service role - bypasses RLS)"""
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+        logger.warning("Service role key not configured, falling back to anon client")
+        return await get_supabase_async()
+    return await _build_supabase_async(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+async def get_supabase_auth():
+    """
+    Yield a fresh, uncached async anon client for sign-up / sign-in / sign-out.
+    supabase-py stores the signed-in session on the client, so these flows
+    must never run on the shared cached client. The client's GoTrue and
+    PostgREST httpx pools are closed once the request is done.
+    """
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
+    from supabase import acreate_client
+    client = await acreate_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    try:
+        yield client
+    finally:
+        await _close_auth_client(client)
+
+async def _close_auth_client(client):
+    try:
+        await client.auth.close()
+        # postgrest is created lazily; only close it if the request touched it
+        postgrest = getattr(client, "_postgrest", None)
+        if postgrest is not None:
+            await postgrest.aclose()
+    except Exception as e:
+        logger.warning("Error closing Supabase auth client: %s", e)
+
+@lru_cache(maxsize=4096)
+def _decode_sub(token: str) -> Optional[str]:
+    """
+    Return the 'sub' claim of a JWT, memoized per token string.
+    Signature is not verified here (Supabase already verified it on the frontend),
+    so the result depends only on the token and is safe to cache.
+    """
+    try:
+        import jwt
+        return jwt.decode(token, options={"verify_signature": False}).get("sub")
+    except Exception as e:
+        logger.error("Error decoding token: %s", e)
+        return None
+
+DEMO_USER_ID = "550e8400-e29b-41d4-a716-446655440000"  # Demo user for testing
+
+def _user_id_from_header(authorization: Optional[str]):
+    """
+    Parse "Bearer <jwt_token>" and return (user_id, None) on success
+    or (None, error_detail) on failure.
     """
     if not authorization:
         logger.warning("No authorization header provided")
-        if os.getenv("ENVIRONMENT") == "development":
-            # Demo user for testing
-            return "550e8400-e29b-41d4-a716-446655440000"
-        raise HTTPException(status_code=401, detail="Authorization header required")
+        return None, "Authorization header required"
     
     # Extract token from "Bearer <token>"
     parts = authorization.split()
     if len(parts) != 2 or parts[0].lower() != "bearer":
         logger.warning("Invalid authorization header format")
-        if os.getenv("ENVIRONMENT") == "development":
-            return "550e8400-e29b-41d4-a716-446655440000"
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-    
-    token = parts[1]
+        return None, "Invalid authorization format"
     
     # Decode JWT to get user_id (sub claim)
-    try:
-        import jwt
-        # Decode without verification first to get the payload
-        # The token is already verified by Supabase on the frontend
-        payload = jwt.decode(token, options={"verify_signature": False})
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            logger.warning("No 'sub' claim in JWT token")
-            if os.getenv("ENVIRONMENT") == "development":
-                return "550e8400-e29b-41d4-a716-446655440000"
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        logger.debug(f"Extracted user ID from token: {user_id}")
+    user_id = _decode_sub(parts[1])
+    
+    if not user_id:
+        logger.warning("No 'sub' claim in JWT token")
+        return None, "Invalid token"
+    
+    logger.debug("Extracted user ID from token: %s", user_id)
+    return user_id, None
+
+# get_user_id is specialized once at import, so the request path never
+# re-checks the environment.
+if IS_DEV:
+    async def get_user_id(authorization: str = Header(None)) -> str:
+        """
+        Extract user ID from JWT token in Authorization header.
+        Development: falls back to the demo user on any auth failure.
+        """
+        user_id, _ = _user_id_from_header(authorization)
+        return user_id or DEMO_USER_ID
+else:
+    async def get_user_id(authorization: str = Header(None)) -> str:
+        """
+        Extract user ID from JWT token in Authorization header.
+        Expected format: "Bearer <jwt_token>"
+        """
+        user_id, error = _user_id_from_header(authorization)
+        if error:
+            raise HTTPException(status_code=401, detail=error)
         return user_id
-        
-    except Exception as e:
-        logger.error(f"Error decoding token: {e}")
-        if os.getenv("ENVIRONMENT") == "development":
-            return "550e8400-e29b-41d4-a716-446655440000"
-        raise HTTPException(status_code=401, detail="Invalid token")
 
 # ==================== CONFIGURATION ====================
 
@@ -0,0 +1,32 @@
+-- Migration: Add get_chat_context RPC
+-- Returns the chat advisor's profile fields and latest 20 transactions
+-- in a single PostgREST round-trip (supabase.rpc("get_chat_context", ...))
+-- Run this in Supabase SQL Editor
+
+CREATE OR REPLACE FUNCTION public.get_chat_context(uid UUID)
+RETURNS JSON AS $$
+  SELECT json_build_object(
+    'profile', (
+      SELECT json_build_object(
+        'monthly_income', p.monthly_income,
+        'fixed_bills', p.fixed_bills,
+        'savings_goal', p.savings_goal
+      )
+      FROM public.user_profiles p
+      WHERE p.id = uid
+      LIMIT 1
+    ),
+    'transactions', COALESCE((
+      SELECT json_agg(t ORDER BY t.created_at DESC)
+      FROM (
+        SELECT merchant, amount, category, created_at
+        FROM public.transactions
+        WHERE user_id = uid
+        ORDER BY created_at DESC
+        LIMIT 20
+      ) t
+    ), '[]'::json)
+  );
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION public.get_chat_context(UUID) TO authenticated, service_role;
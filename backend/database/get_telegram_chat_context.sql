@@ -0,0 +1,37 @@
+-- Migration: Add get_telegram_chat_context RPC
+-- Resolves a Telegram chat to its linked profile, the total of its latest
+-- 20 transactions and the 5 most recent of them, in a single PostgREST
+-- round-trip for the bot's advice path
+-- (supabase.rpc("get_telegram_chat_context", ...))
+-- Run this in Supabase SQL Editor
+
+CREATE OR REPLACE FUNCTION public.get_telegram_chat_context(chat_id BIGINT)
+RETURNS JSON AS $$
+  WITH p AS (
+    SELECT id, monthly_income, fixed_bills, savings_goal
+    FROM public.user_profiles
+    WHERE telegram_chat_id = chat_id
+    LIMIT 1
+  ),
+  recent AS (
+    SELECT merchant, amount, category, created_at
+    FROM public.transactions
+    WHERE user_id = (SELECT id FROM p)
+    ORDER BY created_at DESC
+    LIMIT 20
+  )
+  SELECT json_build_object(
+    'profile', (SELECT row_to_json(p) FROM p),
+    'total_spent', (SELECT COALESCE(SUM(amount), 0) FROM recent),
+    'transactions', COALESCE((
+      SELECT json_agg(json_build_object(
+        'merchant', t.merchant,
+        'amount', t.amount,
+        'category', t.category
+      ) ORDER BY t.created_at DESC)
+      FROM (SELECT * FROM recent ORDER BY created_at DESC LIMIT 5) t
+    ), '[]'::json)
+  );
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION public.get_telegram_chat_context(BIGINT) TO service_role;
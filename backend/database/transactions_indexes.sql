@@ -0,0 +1,10 @@
+-- Migration: Covering indexes for the transaction routes
+-- Run this in Supabase SQL Editor
+
+-- Stats summary: SUM/COUNT per category for one user (index-only scan)
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_amount
+  ON public.transactions (user_id, category) INCLUDE (amount);
+
+-- Transaction list: newest first per user, with LIMIT/OFFSET
+CREATE INDEX IF NOT EXISTS idx_transactions_user_created_at
+  ON public.transactions (user_id, created_at DESC);
@@ -0,0 +1,75 @@
+"""
+Direct Postgres access via a long-lived asyncpg connection pool.
+DATABASE_URL should be the Supabase session-mode connection string
+(port 5432). The prepared-statement cache is disabled so the pool also
+works behind Supavisor/PgBouncer.
+"""
+
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+import asyncpg
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Per worker process: gunicorn runs 4 workers, so the defaults hold 8 idle and
+# at most 40 connections against the Supabase pooler
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool() -> Optional[asyncpg.Pool]:
+    """Return the shared pool, creating it on first use; None if DATABASE_URL is unset."""
+    global _pool
+    if _pool is None and DATABASE_URL:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    command_timeout=60,
+                    max_inactive_connection_lifetime=300,
+                    statement_cache_size=0,
+                )
+                logger.info("Postgres pool initialized (min=%s, max=%s)", DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+    return _pool
+
+
+async def init_pool():
+    """
+    Open the pool at startup so the first requests don't pay for the connections.
+    Without DATABASE_URL, or if Postgres is unreachable, the rest of the API
+    still starts and the transaction routes answer 503 until it is available.
+    """
+    if not DATABASE_URL:
+        logger.warning("DATABASE_URL not configured - transaction routes will return 503")
+        return
+    try:
+        await get_pool()
+    except Exception as e:
+        logger.error("❌ Postgres pool initialization failed: %s", e)
+
+
+async def close_pool():
+    """Close every pooled connection on shutdown."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def get_db() -> AsyncIterator[asyncpg.Connection]:
+    """FastAPI dependency: a pooled connection, released when the request ends."""
+    pool = await get_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    async with pool.acquire() as conn:
+        yield conn
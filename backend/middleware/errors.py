@@ -0,0 +1,84 @@
+"""
+Error Middleware
+Pure-ASGI exception wrapper that emits pre-serialized JSON error bodies
+"""
+import logging
+from typing import Any, Dict
+
+import orjson
+from starlette.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+_JSON_CONTENT_TYPE = (b"content-type", b"application/json")
+
+# The production 500 body never varies, so it is serialized once at import
+_INTERNAL_ERROR_BODY = orjson.dumps({
+    "error": "Internal server error",
+    "message": "An error occurred",
+    "status_code": 500,
+})
+
+
+def error_body(payload: Dict[str, Any]) -> bytes:
+    """Serialize an error payload with orjson (C-level, returns bytes directly)."""
+    return orjson.dumps(payload, default=str)
+
+
+async def send_json_error(send, status_code: int, body: bytes):
+    """Write a complete JSON error response straight to the ASGI send channel."""
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [_JSON_CONTENT_TYPE, (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class ErrorASGIMiddleware:
+    """
+    Catch exceptions escaping the app and answer with a JSON error body.
+    No Request object or handler lookup is involved; the happy path is a
+    single try block around the downstream app.
+    """
+
+    def __init__(self, app, debug: bool = False):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except HTTPException as exc:
+            if response_started:
+                raise
+            logger.error("HTTP Exception: %s - %s", exc.status_code, exc.detail)
+            await send_json_error(send, exc.status_code, error_body({
+                "error": exc.detail,
+                "status_code": exc.status_code,
+            }))
+        except Exception as exc:
+            if response_started:
+                raise
+            logger.exception("Unhandled Exception: %s", exc)
+            if self.debug:
+                body = error_body({
+                    "error": "Internal server error",
+                    "message": str(exc),
+                    "status_code": 500,
+                })
+            else:
+                body = _INTERNAL_ERROR_BODY
+            await send_json_error(send, 500, body)
@@ -0,0 +1,160 @@
+"""
+Fast CORS Middleware
+Pure-ASGI CORS layer with all header values precomputed at startup
+"""
+import re
+from typing import Iterable, Optional
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+SAFELISTED_HEADERS = frozenset({"accept", "accept-language", "content-language", "content-type"})
+
+_PREFLIGHT_VARY = b"Origin, Access-Control-Request-Method, Access-Control-Request-Headers"
+_TEXT_PLAIN = (b"content-type", b"text/plain; charset=utf-8")
+
+
+class FastCORSMiddleware:
+    """
+    Drop-in replacement for Starlette's CORSMiddleware.
+    Header strings are joined and the origin pattern is compiled once in __init__,
+    so the per-request path is a header scan, a set lookup and a list append.
+    Wildcard origins are passed as allow_origin_regex, matched with a compiled fullmatch.
+    """
+
+    def __init__(
+        self,
+        app,
+        allow_origins: Iterable[str] = (),
+        allow_origin_regex: Optional[str] = None,
+        allow_methods: Iterable[str] = ("GET",),
+        allow_headers: Iterable[str] = (),
+        allow_credentials: bool = False,
+        expose_headers: Iterable[str] = (),
+        max_age: int = 600,
+    ):
+        self.app = app
+
+        allow_origins = list(allow_origins)
+        allow_methods = list(allow_methods)
+        allow_headers = [h.lower() for h in allow_headers]
+        expose_headers = list(expose_headers)
+
+        self._allow_all_origins = "*" in allow_origins
+        self._allow_all_headers = "*" in allow_headers
+        self._allow_credentials = allow_credentials
+        # With credentials the browser rejects '*', so the origin is echoed back
+        self._echo_origin = allow_credentials or not self._allow_all_origins
+
+        # Exact origins -> O(1) set lookup; wildcard origins -> one compiled regex
+        self._origins_exact = frozenset(o for o in allow_origins if o != "*")
+        self._origin_regex = re.compile(allow_origin_regex) if allow_origin_regex else None
+
+        if "*" in allow_methods:
+            allow_methods = list(ALL_METHODS)
+        self._methods_allowed = frozenset(allow_methods)
+        self._headers_allowed = SAFELISTED_HEADERS | frozenset(allow_headers)
+
+        self._methods = b", ".join(m.encode() for m in allow_methods)
+        self._headers = b", ".join(h.encode() for h in sorted(self._headers_allowed))
+        self._expose = b", ".join(h.encode() for h in expose_headers)
+
+        # Headers appended to every allowed non-preflight response
+        simple = []
+        if not self._echo_origin:
+            simple.append((b"access-control-allow-origin", b"*"))
+        if allow_credentials:
+            simple.append((b"access-control-allow-credentials", b"true"))
+        if expose_headers:
+            simple.append((b"access-control-expose-headers", self._expose))
+        self._simple_headers = simple
+
+        # Headers sent on every successful preflight
+        preflight = [
+            (b"vary", _PREFLIGHT_VARY),
+            (b"access-control-allow-methods", self._methods),
+            (b"access-control-max-age", str(max_age).encode()),
+        ]
+        if not self._echo_origin:
+            preflight.append((b"access-control-allow-origin", b"*"))
+        if not self._allow_all_headers:
+            preflight.append((b"access-control-allow-headers", self._headers))
+        if allow_credentials:
+            preflight.append((b"access-control-allow-credentials", b"true"))
+        self._preflight_headers = preflight
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if self._allow_all_origins or origin in self._origins_exact:
+            return True
+        return self._origin_regex is not None and self._origin_regex.fullmatch(origin) is not None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(origin, request_method, request_headers, send)
+            return
+
+        if not self.is_allowed_origin(origin.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        extra = list(self._simple_headers)
+        if self._echo_origin:
+            extra.append((b"access-control-allow-origin", origin))
+            extra.append((b"vary", b"Origin"))
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *extra]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, origin: bytes, request_method: bytes, request_headers: Optional[bytes], send):
+        """Answer an OPTIONS preflight directly, without touching the app."""
+        failures = []
+        headers = list(self._preflight_headers)
+
+        if self.is_allowed_origin(origin.decode("latin-1")):
+            if self._echo_origin:
+                headers.append((b"access-control-allow-origin", origin))
+        else:
+            failures.append("origin")
+
+        if request_method.decode("latin-1") not in self._methods_allowed:
+            failures.append("method")
+
+        if request_headers is not None:
+            if self._allow_all_headers:
+                headers.append((b"access-control-allow-headers", request_headers))
+            else:
+                for header in request_headers.decode("latin-1").lower().split(","):
+                    if header.strip() not in self._headers_allowed:
+                        failures.append("headers")
+                        break
+
+        if failures:
+            status = 400
+            body = ("Disallowed CORS " + ", ".join(failures)).encode()
+        else:
+            status = 200
+            body = b"OK"
+
+        headers.append(_TEXT_PLAIN)
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
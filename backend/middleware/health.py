@@ -0,0 +1,25 @@
+"""
+Health Fast Path Middleware
+Answers HEAD liveness pings on the health endpoint before any other layer runs
+"""
+
+_EMPTY_HEADERS = [(b"content-length", b"0")]
+
+
+class HealthFastPathMiddleware:
+    """
+    Outermost pure-ASGI layer: a HEAD request to the health path gets an empty
+    200 without going through CORS, error handling or routing. Everything else
+    is passed straight through.
+    """
+
+    def __init__(self, app, path: str = "/api/health"):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "HEAD" and scope["path"] == self.path:
+            await send({"type": "http.response.start", "status": 200, "headers": _EMPTY_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self.app(scope, receive, send)
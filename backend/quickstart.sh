@@ -56,7 +56,7 @@ if [ ! -f ".env" ]; then
     if [ -f ".env.example" ]; then
         cp .env.example .env
         echo -e "${YELLOW}⚠️  Created .env from template. Please update with your values:${NC}"
-        echo "   SUPABASE_URL, SUPABASE_KEY, TELEGRAM_BOT_TOKEN, GEMINI_API_KEY, HF_TOKEN"
+        echo "   SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, TELEGRAM_BOT_TOKEN, GEMINI_API_KEY, HF_TOKEN"
         echo ""
     else
         echo -e "${RED}❌ .env file not found. Create it with your API keys${NC}"
@@ -1,14 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, Optional, List
 from datetime import datetime
-from config import get_supabase, get_user_id
-from services.qwen_service import (
-    parse_receipt_with_qwen,
-    analyze_transaction_with_qwen
-)
+from config import IS_DEV, get_supabase, get_supabase_admin, get_user_id
+from services.qwen_service import analyze_transaction_with_qwen
+from services.receipt_dedup import submit_receipt
+from services.scheduler_service import send_weekly_summaries
 from services.qwen_chat_service import (
     chat_with_advisor,
+    chat_with_advisor_stream,
     categorize_transaction,
     analyze_spending_pattern
 )
@@ -28,58 +29,85 @@ from services.notification_service import (
     NotificationChannel,
     NotificationType
 )
+import asyncio
 import logging
-import base64
+import time
+import orjson
+from functools import lru_cache
 
+from fastapi.concurrency import run_in_threadpool
 from supabase import Client
+from services.user_cache import (
+    profile_cache,
+    telegram_cache,
+    recent_transactions_cache,
+    missing_profile_cache,
+    invalidate_profile
+)
 
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class AnalyzeReceiptRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     image_url: Optional[str] = None
     image_base64: Optional[str] = None
 
 class CategorizeRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     merchant: str
     amount: Optional[float] = None
     description: Optional[str] = ""
 
 class AnalyzeSpendingRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     monthly_income: float
     fixed_bills: float
     savings_goal: float
 
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     message: str
-    transactions: Optional[List[dict]] = []
+    transactions: Optional[List[Dict[str, Any]]] = []
     monthlyIncome: Optional[float] = None
     fixedBills: Optional[float] = None
     savingsGoal: Optional[float] = None
 
 class FinancialHealthRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     monthly_income: float
     fixed_bills: float
     savings_goal: float
 
 class TransactionAnalysisRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     merchant: str
     amount: float
     category: str
     description: Optional[str] = ""
 
 class TelegramSettingsRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     telegram_chat_id: Optional[int] = None
     bot_token: Optional[str] = None
     enable_notifications: Optional[bool] = True
 
 class HealthTipsRequest(BaseModel):
-    transactions: Optional[List[dict]] = []
+    model_config = ConfigDict(extra="ignore")
+
+    transactions: Optional[List[Dict[str, Any]]] = []
     monthlyIncome: Optional[float] = 0
     fixedBills: Optional[float] = 0
     savingsGoal: Optional[float] = 0
-    categoryTotals: Optional[dict] = {}
+    categoryTotals: Optional[Dict[str, Any]] = {}
 
 @router.post("/analyze-receipt")
 async def analyze_receipt_endpoint(
@@ -109,8 +137,8 @@ async def analyze_receipt_endpoint(
         
         logger.info(f"Receipt analysis started for user {user_id}, source type: {'base64' if request.image_base64 else 'url'}")
         
-        # Parse receipt using Qwen with OCR + text-based analysis
-        extracted_data = await parse_receipt_with_qwen(image_source)
+        # Parse receipt using Qwen with OCR + text-based analysis (identical images share one parse)
+        extracted_data = await submit_receipt(image_source)
         
         logger.info(f"Receipt analysis complete: merchant='{extracted_data.get('merchant')}', amount={extracted_data.get('amount')}")
         
@@ -142,16 +170,11 @@ async def analyze_receipt_upload(
     Analyze an uploaded receipt image using Qwen model.
     """
     try:
-        # Read and encode file to base64
+        # OCR runs locally on the raw bytes, so the upload is never base64-encoded
         contents = await file.read()
-        base64_image = base64.b64encode(contents).decode('utf-8')
-        
-        # Determine mime type
-        mime_type = file.content_type or "image/jpeg"
-        image_data = f"data:{mime_type};base64,{base64_image}"
         
         # Parse receipt with Qwen
-        extracted_data = await parse_receipt_with_qwen(image_data)
+        extracted_data = await submit_receipt(contents)
         
         return {
             "success": True,
@@ -211,13 +234,14 @@ async def get_spending_insights_endpoint(
         # Analyze spending patterns
         analysis = await analyze_spending_patterns(user_id, supabase, months=1)
         
-        # Generate financial advice
+        # Generate financial advice from the same analysis instead of re-querying
         advice = await generate_financial_advice(
             user_id,
             supabase,
             request.monthly_income,
             request.fixed_bills,
-            request.savings_goal
+            request.savings_goal,
+            analysis=analysis
         )
         
         return {
@@ -283,6 +307,127 @@ async def categorize_transaction_endpoint(
         }
 
 
+async def _fetch_chat_profile(supabase: Client, user_id: str) -> Optional[dict]:
+    """Profile row for chat context, from cache or Supabase (None if unavailable)."""
+    profile_data = profile_cache.get(user_id)
+    if profile_data is not None:
+        return profile_data
+    try:
+        profile = await run_in_threadpool(
+            lambda: supabase.table("user_profiles").select(
+                "monthly_income, fixed_bills, savings_goal"
+            ).eq("id", user_id).limit(1).execute()
+        )
+    except Exception as e:
+        logger.warning(f"Could not fetch profile: {e}")
+        return None
+    if profile.data and len(profile.data) > 0:
+        profile_cache[user_id] = profile.data[0]
+        return profile.data[0]
+    return None
+
+
+async def _fetch_recent_transactions(supabase: Client, user_id: str) -> List[dict]:
+    """Last 20 transactions for chat context, from cache or Supabase ([] if unavailable)."""
+    recent = recent_transactions_cache.get(user_id)
+    if recent is not None:
+        return recent
+    try:
+        tx_response = await run_in_threadpool(
+            lambda: supabase.table("transactions").select(
+                "merchant, amount, category"
+            ).eq("user_id", user_id).order("created_at", desc=True).limit(20).execute()
+        )
+    except Exception as e:
+        logger.debug(f"Could not fetch transactions from DB: {e}")
+        return []
+    recent = recent_transactions_cache[user_id] = tx_response.data or []
+    return recent
+
+
+async def _fetch_chat_context_rpc(supabase: Client, user_id: str):
+    """
+    Profile and last 20 transactions in one round-trip via the get_chat_context
+    RPC (database/get_chat_context.sql). Falls back to the two separate
+    queries if the function isn't deployed.
+    """
+    try:
+        response = await run_in_threadpool(
+            lambda: supabase.rpc("get_chat_context", {"uid": user_id}).execute()
+        )
+    except Exception as e:
+        logger.debug(f"get_chat_context RPC unavailable, using separate queries: {e}")
+        return await asyncio.gather(
+            _fetch_chat_profile(supabase, user_id),
+            _fetch_recent_transactions(supabase, user_id),
+        )
+    data = response.data or {}
+    profile_data = data.get("profile")
+    recent = data.get("transactions") or []
+    if profile_data:
+        profile_cache[user_id] = profile_data
+    recent_transactions_cache[user_id] = recent
+    return profile_data, recent
+
+
+async def _build_chat_context(request: ChatRequest, user_id: str, supabase: Client) -> Dict[str, Any]:
+    """
+    Build the advisor's user context: actual spending (transactions) vs
+    expected (profile). Shared by /chat and /chat-stream.
+    """
+    # Compute total spent from uploaded transactions
+    total_spent = _total_spent(request.transactions) if request.transactions else 0
+
+    # Build user context: actual spending (transactions) vs expected (profile)
+    user_context = {
+        "monthlyIncome": request.monthlyIncome or 0,
+        "fixedBills": request.fixedBills or 0,
+        "savingsGoal": request.savingsGoal or 0,
+        "totalSpent": total_spent,
+    }
+
+    # Fetch profile (if frontend didn't send full context) and recent DB
+    # transactions (if too few were sent). When both miss the cache they come
+    # from one RPC; otherwise the needed fetches run concurrently and
+    # asyncio.sleep(0) stands in for a fetch that isn't needed
+    need_profile = (request.fixedBills is None or request.savingsGoal is None or request.monthlyIncome is None) and supabase
+    need_transactions = not request.transactions or len(request.transactions) < 5
+    if (
+        need_profile and need_transactions
+        and user_id not in profile_cache and user_id not in recent_transactions_cache
+    ):
+        profile_data, recent = await _fetch_chat_context_rpc(supabase, user_id)
+    else:
+        profile_data, recent = await asyncio.gather(
+            _fetch_chat_profile(supabase, user_id) if need_profile else asyncio.sleep(0),
+            _fetch_recent_transactions(supabase, user_id) if need_transactions else asyncio.sleep(0),
+        )
+
+    if profile_data:
+        user_context["monthlyIncome"] = user_context["monthlyIncome"] or float(profile_data.get("monthly_income") or 0)
+        user_context["fixedBills"] = request.fixedBills if request.fixedBills is not None else float(profile_data.get("fixed_bills") or 0)
+        user_context["savingsGoal"] = request.savingsGoal if request.savingsGoal is not None else float(profile_data.get("savings_goal") or 0)
+        logger.info(f"Fetched profile for user {user_id}: income={user_context['monthlyIncome']}")
+
+    # Top up to 20 transactions with DB rows, without mutating the request model
+    transactions = request.transactions or []
+    if recent:
+        transactions = transactions[:20]
+        transactions.extend(recent[:20 - len(transactions)])
+        logger.info(f"Fetched {len(recent)} transactions from database")
+
+    # Add transaction summary for the AI
+    if transactions:
+        last_20 = transactions[-20:]
+        user_context["transactionSummary"] = "\nRecent transactions (actual spending):\n" + "\n".join(
+            f"- {t.get('merchant', 'Unknown')}: {t.get('amount', 0)} ({t.get('category', 'Other')})"
+            for t in last_20
+        )
+        logger.info(f"Chat context prepared: {len(transactions)} transactions")
+
+    return user_context
+
+
 @router.post("/chat")
 async def chat_endpoint(
     request: ChatRequest,
@@ -293,64 +438,9 @@ async def chat_endpoint(
     Financial advisor chat using uploaded transactions and profile expenses.
     Uses actual transaction data vs monthly expected (fixedBills, savingsGoal) from profile.
     """
-    import time
     start = time.time()
     try:
-        # Compute total spent from uploaded transactions
-        total_spent = 0
-        if request.transactions:
-            for t in request.transactions:
-                amt = t.get("amount", 0) or 0
-                total_spent += abs(float(amt)) if amt else 0
-
-        # Build user context: actual spending (transactions) vs expected (profile)
-        user_context = {
-            "monthlyIncome": request.monthlyIncome or 0,
-            "fixedBills": request.fixedBills or 0,
-            "savingsGoal": request.savingsGoal or 0,
-            "totalSpent": total_spent,
-        }
-
-        # Fetch profile if frontend didn't send full context
-        if (request.fixedBills is None or request.savingsGoal is None or request.monthlyIncome is None) and supabase:
-            try:
-                profile = supabase.table("user_profiles").select(
-                    "monthly_income, fixed_bills, savings_goal"
-                ).eq("id", user_id).execute()
-                if profile.data and len(profile.data) > 0:
-                    profile_data = profile.data[0]
-                    user_context["monthlyIncome"] = user_context["monthlyIncome"] or float(profile_data.get("monthly_income") or 0)
-                    user_context["fixedBills"] = request.fixedBills if request.fixedBills is not None else float(profile_data.get("fixed_bills") or 0)
-                    user_context["savingsGoal"] = request.savingsGoal if request.savingsGoal is not None else float(profile_data.get("savings_goal") or 0)
-                    logger.info(f"Fetched profile for user {user_id}: income={user_context['monthlyIncome']}")
-            except Exception as e:
-                logger.warning(f"Could not fetch profile: {e}")
-
-        # Fetch additional transactions from database if not provided
-        if not request.transactions or len(request.transactions) < 5:
-            try:
-                tx_response = supabase.table("transactions").select(
-                    "merchant, amount, category"
-                ).eq("user_id", user_id).order("created_at", desc=True).limit(20).execute()
-                
-                if tx_response.data:
-                    request.transactions = request.transactions or []
-                    for tx in tx_response.data:
-                        if len(request.transactions) < 20:
-                            request.transactions.append(tx)
-                    logger.info(f"Fetched {len(tx_response.data)} transactions from database")
-            except Exception as e:
-                logger.debug(f"Could not fetch transactions from DB: {e}")
-
-        # Add transaction summary for the AI
-        tx_summary = ""
-        if request.transactions and len(request.transactions) > 0:
-            tx_summary = "\nRecent transactions (actual spending):\n" + "\n".join([
-                f"- {t.get('merchant', 'Unknown')}: {t.get('amount', 0)} ({t.get('category', 'Other')})"
-                for t in (request.transactions[-20:])  # last 20
-            ])
-            user_context["transactionSummary"] = tx_summary
-            logger.info(f"Chat context prepared: {len(request.transactions)} transactions")
+        user_context = await _build_chat_context(request, user_id, supabase)
 
         advice = await chat_with_advisor(
             request.message,
@@ -372,6 +462,189 @@ async def chat_endpoint(
         }
 
 
+def _sse(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+@router.post("/chat-stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    user_id: str = Depends(get_user_id),
+    supabase: Client = Depends(get_supabase)
+):
+    """
+    Streaming variant of /chat. Sends Server-Sent Events as the advisor
+    generates: {"token": ...} per chunk, then {"done": true, "duration": ms}.
+    Generation stops as soon as the client disconnects.
+    """
+    start = time.time()
+    user_context = await _build_chat_context(request, user_id, supabase)
+
+    async def event_generator():
+        try:
+            async for token in chat_with_advisor_stream(request.message, user_context):
+                if await http_request.is_disconnected():
+                    logger.info(f"Chat stream client disconnected for user {user_id}")
+                    return
+                yield _sse({"token": token})
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}", exc_info=True)
+            yield _sse({"error": str(e)})
+            return
+        yield _sse({"done": True, "duration": round((time.time() - start) * 1000)})
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Above these sizes aggregations switch to NumPy; below them the import and
+# array construction cost more than the Python loop they replace
+NUMPY_MIN_TRANSACTIONS = 200
+NUMPY_MIN_CATEGORIES = 64
+
+
+def _total_spent(transactions: List[dict]) -> float:
+    """Sum of absolute transaction amounts (missing/None amounts count as 0)."""
+    if len(transactions) >= NUMPY_MIN_TRANSACTIONS:
+        import numpy as np
+        amounts = np.fromiter(
+            (float(t.get("amount") or 0) for t in transactions),
+            dtype=np.float64,
+            count=len(transactions)
+        )
+        return float(np.abs(amounts).sum())
+    
+    total = 0.0
+    for t in transactions:
+        total += abs(float(t.get("amount") or 0))
+    return total
+
+
+def _top_category(category_totals: dict):
+    """Return (category, amount) for the highest-spend category."""
+    if len(category_totals) > NUMPY_MIN_CATEGORIES:
+        import numpy as np
+        names = list(category_totals)
+        amounts = np.fromiter(category_totals.values(), dtype=np.float64, count=len(names))
+        best = int(np.argmax(amounts))
+        return names[best], category_totals[names[best]]
+    
+    category_name = None
+    category_amount = float("-inf")
+    for name, amount in category_totals.items():
+        if amount > category_amount:
+            category_name, category_amount = name, amount
+    return category_name, category_amount
+
+
+# Static tip lists, built once instead of per request
+BASIC_TIPS = (
+    "Start logging expenses to get personalized financial tips!",
+    "Track 10+ transactions to unlock detailed spending insights.",
+    "Set spending budgets by category to stay on track."
+)
+
+FALLBACK_TIPS = (
+    "Keep tracking your expenses!",
+    "Review your spending patterns weekly.",
+    "Set up budget alerts for each category.",
+    "Use the Telegram bot to log expenses on the go.",
+    "Schedule monthly financial reviews."
+)
+
+
+# Parameterized tip templates, bound once at import (str.format of a
+# constant template) so the handler only makes one call per tip
+_TIP_SPEND_HIGH = "⚠️ You're spending {:.0f}% of your income. Try to reduce discretionary spending.".format
+_TIP_SPEND_MODERATE = "You're spending {:.0f}% of your income. Consider setting aside more for savings.".format
+_TIP_SPEND_LOW = "Good job! You're spending only {:.0f}% of your income.".format
+_TIP_TOP_CATEGORY = "💰 Your highest spending is in {}: {}. Look for ways to optimize this category.".format
+_TIP_SAVINGS_MET = "✅ Great! You can save {} this month, exceeding your goal of {}.".format
+_TIP_SAVINGS_SHORT = "📊 You need to save {} more to reach your monthly savings goal of {}.".format
+_TIP_DIVERSIFIED = "Good diversification across {} spending categories.".format
+_TIP_BILLS_OK = "Your fixed bills are {:.0f}% of income - well managed!".format
+
+
+@lru_cache(maxsize=1024)
+def _fmt_naira(amount: int) -> str:
+    """Format a whole-naira amount with thousands separators (memoized)."""
+    return f"₦{amount:,}"
+
+
+def _compute_health_tips(
+    transactions: List[dict],
+    monthly_income: float,
+    fixed_bills: float,
+    savings_goal: float,
+    category_totals: dict
+) -> List[str]:
+    """
+    Build up to 6 personalized health tips from spending data.
+    Shared by /health-tips and /send-health-notification.
+    """
+    # If no transactions, return basic tips
+    if not transactions:
+        return list(BASIC_TIPS)
+    
+    tips = []
+    
+    # Calculate total spent
+    total_spent = _total_spent(transactions)
+    
+    # Tip 1: Income vs Spending ratio
+    if monthly_income > 0:
+        spending_ratio = (total_spent / monthly_income) * 100
+        if spending_ratio > 90:
+            tips.append(_TIP_SPEND_HIGH(spending_ratio))
+        elif spending_ratio > 70:
+            tips.append(_TIP_SPEND_MODERATE(spending_ratio))
+        else:
+            tips.append(_TIP_SPEND_LOW(spending_ratio))
+    
+    # Tip 2: Highest spending category
+    if category_totals:
+        category_name, category_amount = _top_category(category_totals)
+        tips.append(_TIP_TOP_CATEGORY(category_name, _fmt_naira(round(category_amount))))
+    
+    # Tip 3: Savings goal progress
+    if savings_goal > 0:
+        monthly_after_bills = monthly_income - fixed_bills - total_spent
+        if monthly_after_bills >= savings_goal:
+            tips.append(_TIP_SAVINGS_MET(_fmt_naira(round(monthly_after_bills)), _fmt_naira(round(savings_goal))))
+        else:
+            remaining_needed = savings_goal - monthly_after_bills
+            tips.append(_TIP_SAVINGS_SHORT(_fmt_naira(round(remaining_needed)), _fmt_naira(round(savings_goal))))
+    
+    # Tip 4: Transaction count insight
+    transaction_count = len(transactions)
+    if transaction_count < 5:
+        tips.append("📝 Track at least 10-15 transactions for better spending pattern analysis.")
+    elif transaction_count > 30:
+        tips.append("📈 You have detailed transaction history! Review weekly for better insights.")
+    
+    # Tip 5: Category diversity
+    if category_totals:
+        num_categories = len(category_totals)
+        if num_categories < 3:
+            tips.append("🎯 Consider diversifying your spending across more categories for better budgeting.")
+        else:
+            tips.append(_TIP_DIVERSIFIED(num_categories))
+    
+    # Tip 6: General financial advice
+    if monthly_income > 0 and fixed_bills > 0:
+        bills_ratio = (fixed_bills / monthly_income) * 100
+        if bills_ratio > 50:
+            tips.append("🏠 Your fixed bills are high. Explore ways to reduce housing or utility costs.")
+        else:
+            tips.append(_TIP_BILLS_OK(bills_ratio))
+    
+    return tips  # Each of the 6 sections adds at most one tip, so no truncation needed
+
+
 @router.post("/health-tips")
 async def get_health_tips_endpoint(
     request: HealthTipsRequest,
@@ -383,80 +656,16 @@ async def get_health_tips_endpoint(
     Accepts POST with transaction data for more dynamic tips.
     """
     try:
-        transactions = request.transactions or []
-        monthly_income = request.monthlyIncome or 0
-        fixed_bills = request.fixedBills or 0
-        savings_goal = request.savingsGoal or 0
-        category_totals = request.categoryTotals or {}
-        
-        tips = []
-        
-        # If no transactions, return basic tips
-        if not transactions:
-            return {
-                "success": True,
-                "tips": [
-                    "Start logging expenses to get personalized financial tips!",
-                    "Track 10+ transactions to unlock detailed spending insights.",
-                    "Set spending budgets by category to stay on track."
-                ]
-            }
-        
-        # Calculate total spent
-        total_spent = sum(abs(t.get("amount", 0)) for t in transactions)
-        
-        # Tip 1: Income vs Spending ratio
-        if monthly_income > 0:
-            spending_ratio = (total_spent / monthly_income) * 100
-            if spending_ratio > 90:
-                tips.append(f"⚠️ You're spending {spending_ratio:.0f}% of your income. Try to reduce discretionary spending.")
-            elif spending_ratio > 70:
-                tips.append(f"You're spending {spending_ratio:.0f}% of your income. Consider setting aside more for savings.")
-            else:
-                tips.append(f"Good job! You're spending only {spending_ratio:.0f}% of your income.")
-        
-        # Tip 2: Highest spending category
-        if category_totals:
-            highest_category = max(category_totals.items(), key=lambda x: x[1])
-            category_name = highest_category[0]
-            category_amount = highest_category[1]
-            tips.append(f"💰 Your highest spending is in {category_name}: ₦{category_amount:,.0f}. Look for ways to optimize this category.")
-        
-        # Tip 3: Savings goal progress
-        if savings_goal > 0:
-            monthly_after_bills = monthly_income - fixed_bills - total_spent
-            if monthly_after_bills >= savings_goal:
-                tips.append(f"✅ Great! You can save ₦{monthly_after_bills:,.0f} this month, exceeding your goal of ₦{savings_goal:,.0f}.")
-            else:
-                remaining_needed = savings_goal - monthly_after_bills
-                tips.append(f"📊 You need to save ₦{remaining_needed:,.0f} more to reach your monthly savings goal of ₦{savings_goal:,.0f}.")
-        
-        # Tip 4: Transaction count insight
-        transaction_count = len(transactions)
-        if transaction_count < 5:
-            tips.append("📝 Track at least 10-15 transactions for better spending pattern analysis.")
-        elif transaction_count > 30:
-            tips.append("📈 You have detailed transaction history! Review weekly for better insights.")
-        
-        # Tip 5: Category diversity
-        if category_totals:
-            num_categories = len(category_totals)
-            if num_categories < 3:
-                tips.append("🎯 Consider diversifying your spending across more categories for better budgeting.")
-            else:
-                tips.append(f"Good diversification across {num_categories} spending categories.")
-        
-        # Tip 6: General financial advice
-        if monthly_income > 0 and fixed_bills > 0:
-            bills_ratio = (fixed_bills / monthly_income) * 100
-            if bills_ratio > 50:
-                tips.append("🏠 Your fixed bills are high. Explore ways to reduce housing or utility costs.")
-            else:
-                tips.append(f"Your fixed bills are {bills_ratio:.0f}% of income - well managed!")
-        
+        tips = _compute_health_tips(
+            request.transactions or [],
+            request.monthlyIncome or 0,
+            request.fixedBills or 0,
+            request.savingsGoal or 0,
+            request.categoryTotals or {}
+        )
         return {
             "success": True,
-            "tips": tips[:6]  # Return top 6 tips
+            "tips": tips
         }
         
     except Exception as e:
@@ -464,13 +673,7 @@ async def get_health_tips_endpoint(
         # Return fallback tips instead of error
         return {
             "success": True,
-            "tips": [
-                "Keep tracking your expenses!",
-                "Review your spending patterns weekly.",
-                "Set up budget alerts for each category.",
-                "Use the Telegram bot to log expenses on the go.",
-                "Schedule monthly financial reviews."
-            ]
+            "tips": FALLBACK_TIPS
         }
 
 
@@ -486,8 +689,6 @@ async def send_budget_alert_endpoint(
     Send a budget alert notification to the user.
     """
     try:
-        from services.notification_service import send_budget_alert
-        
         success = await send_budget_alert(
             user_id,
             spent_amount,
@@ -515,11 +716,24 @@ async def send_health_notification_endpoint(
     Send a periodic financial health improvement notification.
     """
     try:
-        from services.notification_service import send_health_tip
-        
-        # Get a health tip
-        tips_response = await get_health_tips_endpoint(user_id, supabase)
-        tips = tips_response.get("tips", [])
+        # Build tips from the user's profile and recent transactions
+        profile_data, recent = await asyncio.gather(
+            _fetch_chat_profile(supabase, user_id),
+            _fetch_recent_transactions(supabase, user_id),
+        )
+        profile_data = profile_data or {}
+        category_totals = {}
+        for t in recent:
+            category = t.get("category") or "Other"
+            category_totals[category] = category_totals.get(category, 0) + abs(float(t.get("amount") or 0))
+        
+        tips = _compute_health_tips(
+            recent,
+            float(profile_data.get("monthly_income") or 0),
+            float(profile_data.get("fixed_bills") or 0),
+            float(profile_data.get("savings_goal") or 0),
+            category_totals
+        )
         
         if tips:
             tip = tips[0]
@@ -549,8 +763,6 @@ async def send_weekly_summary_endpoint(
     Send a weekly spending summary notification.
     """
     try:
-        from services.notification_service import send_weekly_summary
-        
         # Get transactions from this week
         analysis = await analyze_spending_patterns(user_id, supabase, months=1)
         
@@ -581,6 +793,28 @@ async def send_weekly_summary_endpoint(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/send-weekly-summary-all")
+async def send_weekly_summary_all_endpoint(
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Run the scheduled weekly-summary broadcast now (all users, bounded concurrency).
+    Development only; in production the Monday scheduler job sends these.
+    """
+    if not IS_DEV:
+        raise HTTPException(status_code=403, detail="Broadcast is only available in development")
+    
+    try:
+        sent = await send_weekly_summaries()
+        return {
+            "success": True,
+            "sent": sent
+        }
+    except Exception as e:
+        logger.error(f"Error sending weekly summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/telegram/settings")
 async def update_telegram_settings(
     request: TelegramSettingsRequest,
@@ -593,9 +827,12 @@ async def update_telegram_settings(
     """
     try:
         # Update user profile with Telegram settings
-        response = supabase.table("user_profiles").update({
-            "telegram_chat_id": request.telegram_chat_id
-        }).eq("id", user_id).execute()
+        response = await run_in_threadpool(
+            lambda: supabase.table("user_profiles").update({
+                "telegram_chat_id": request.telegram_chat_id
+            }).eq("id", user_id).execute()
+        )
+        invalidate_profile(user_id)
         
         if response.data:
             return {
@@ -612,6 +849,14 @@ async def update_telegram_settings(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Served when the user has no profile row yet
+_DEFAULT_TELEGRAM_SETTINGS = {
+    "success": True,
+    "telegram_chat_id": None,
+    "notifications_enabled": False
+}
+
+
 @router.get("/telegram/settings")
 async def get_telegram_settings(
     user_id: str = Depends(get_user_id),
@@ -621,42 +866,51 @@ async def get_telegram_settings(
     Get current Telegram notification settings for a user.
     """
     try:
+        cached = telegram_cache.get(user_id)
+        if cached is not None:
+            return cached
+        if user_id in missing_profile_cache:
+            return _DEFAULT_TELEGRAM_SETTINGS
+        
         # Don't use .single() as it fails with 0 rows
-        response = supabase.table("user_profiles").select(
-            "telegram_chat_id"
-        ).eq("id", user_id).execute()
+        response = await run_in_threadpool(
+            lambda: supabase.table("user_profiles").select(
+                "telegram_chat_id"
+            ).eq("id", user_id).limit(1).execute()
+        )
         
         if response.data and len(response.data) > 0:
             telegram_chat_id = response.data[0].get("telegram_chat_id")
-            return {
+            settings = telegram_cache[user_id] = {
                 "success": True,
                 "telegram_chat_id": telegram_chat_id,
                 "notifications_enabled": telegram_chat_id is not None
             }
+            return settings
         
         # Try with service role if not found
         logger.warning(f"Telegram settings not found with anon client for user {user_id}")
-        from config import get_supabase_admin
         admin_supabase = get_supabase_admin()
-        response = admin_supabase.table("user_profiles").select(
-            "telegram_chat_id"
-        ).eq("id", user_id).execute()
+        response = await run_in_threadpool(
+            lambda: admin_supabase.table("user_profiles").select(
+                "telegram_chat_id"
+            ).eq("id", user_id).limit(1).execute()
+        )
         
         if response.data and len(response.data) > 0:
             telegram_chat_id = response.data[0].get("telegram_chat_id")
-            return {
+            settings = telegram_cache[user_id] = {
                 "success": True,
                 "telegram_chat_id": telegram_chat_id,
                 "notifications_enabled": telegram_chat_id is not None
             }
+            return settings
         
-        # Return default if profile not found
+        # Return default if profile not found, and remember the miss so the
+        # next calls skip both queries until the TTL expires or a write lands
         logger.warning(f"Telegram settings profile not found for user {user_id}, returning defaults")
-        return {
-            "success": True,
-            "telegram_chat_id": None,
-            "notifications_enabled": False
-        }
+        missing_profile_cache[user_id] = True
+        return _DEFAULT_TELEGRAM_SETTINGS
         
     except HTTPException:
         raise
@@ -679,8 +933,6 @@ async def test_telegram_connection(
     Send a test notification to verify Telegram connection is working.
     """
     try:
-        from services.notification_service import send_health_tip
-        
         test_tip = "🧪 Test notification: Your Telegram integration is working perfectly!"
         
         success = await send_health_tip(user_id, test_tip, supabase)
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from pydantic import BaseModel, EmailStr
-from config import get_supabase, get_user_id
+from config import IS_DEV, get_supabase_admin_async, get_supabase_auth, get_user_id
 from typing import Optional
 import logging
-import os
-from supabase import Client
+from supabase import AsyncClient
+from services.user_cache import invalidate_profile
+from services.profile_loader import admin_profile_loader
 from datetime import datetime, timedelta
 import random
 import string
@@ -22,22 +23,65 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+class UserOut(BaseModel):
+    id: str
+    email: Optional[str] = None
+    name: str = ""
+    telegram_connected: bool = False
+
+class SessionOut(BaseModel):
+    access_token: str
+    refresh_token: str
+    expires_in: Optional[int] = None
+    token_type: str = "bearer"
+
 class AuthResponse(BaseModel):
     success: bool
     message: str
-    user: dict
-    session: Optional[dict] = None
+    user: UserOut
+    session: Optional[SessionOut] = None
+
+def _session_out(session) -> Optional[SessionOut]:
+    """Session payload for AuthResponse, or None when sign-up/in returned no session."""
+    if not session:
+        return None
+    return SessionOut(
+        access_token=session.access_token,
+        refresh_token=session.refresh_token,
+        expires_in=session.expires_in
+    )
+
+async def _ensure_profile(supabase: AsyncClient, user_id: str, email: str, name: str):
+    """Insert the default user_profiles row for a new signup (background task)."""
+    try:
+        logger.info("Creating profile for user %s", user_id)
+        profile_response = await supabase.table("user_profiles").insert({
+            "id": user_id,
+            "email": email,
+            "name": name,
+            "monthly_income": 0,
+            "fixed_bills": 0,
+            "savings_goal": 0,
+            "telegram_connected": False,
+            "push_notification_enabled": True
+        }).execute()
+        invalidate_profile(user_id)
+        logger.info("Profile created successfully: %s", profile_response)
+    except Exception as profile_error:
+        logger.warning("Profile creation warning (may be created by trigger): %s", profile_error)
+        # This is not critical - the database trigger might have already created it
 
 @router.post("/signup", response_model=AuthResponse)
 async def signup(
     request: SignupRequest,
-    supabase = Depends(get_supabase)
+    background_tasks: BackgroundTasks,
+    supabase: AsyncClient = Depends(get_supabase_auth)
 ):
     """Sign up a new user with profile creation"""
     try:
         # Create auth user
-        logger.info(f"Creating auth user for email: {request.email}")
-        auth_response = supabase.auth.sign_up({
+        logger.info("Creating auth user for email: %s", request.email)
+        auth_response = await supabase.auth.sign_up({
             "email": request.email,
             "password": request.password,
             "options": {
@@ -48,130 +92,92 @@ async def signup(
         })
         
         if not auth_response.user:
-            logger.error(f"Auth signup failed for {request.email}")
+            logger.error("Auth signup failed for %s", request.email)
             raise HTTPException(status_code=400, detail="Signup failed - could not create user")
         
-        # Create user profile (database trigger should also create it)
+        # Create user profile after the response is sent (database trigger
+        # should also create it, so the client doesn't wait on this insert)
         user_id = auth_response.user.id
         name = request.name or request.email.split("@")[0]
+        background_tasks.add_task(_ensure_profile, supabase, user_id, request.email, name)
         
-        try:
-            logger.info(f"Creating profile for user {user_id}")
-            profile_response = supabase.table("user_profiles").insert({
-                "id": user_id,
-                "email": request.email,
-                "name": name,
-                "monthly_income": 0,
-                "fixed_bills": 0,
-                "savings_goal": 0,
-                "telegram_connected": False,
-                "push_notification_enabled": True
-            }).execute()
-            logger.info(f"Profile created successfully: {profile_response}")
-        except Exception as profile_error:
-            logger.warning(f"Profile creation warning (may be created by trigger): {profile_error}")
-            # This is not critical - the database trigger might have already created it
-        
-        logger.info(f"Signup successful for user {user_id}")
-        
-        # Build session data
-        session_data = {}
-        if auth_response.session:
-            session_data = {
-                "access_token": auth_response.session.access_token,
-                "refresh_token": auth_response.session.refresh_token,
-                "expires_in": auth_response.session.expires_in,
-                "token_type": "bearer"
-            }
+        logger.info("Signup successful for user %s", user_id)
         
         return AuthResponse(
             success=True,
             message="Signup successful. You can now log in.",
-            user={
-                "id": user_id,
-                "email": request.email,
-                "name": name
-            },
-            session=session_data if session_data else None
+            user=UserOut(
+                id=user_id,
+                email=request.email,
+                name=name
+            ),
+            session=_session_out(auth_response.session)
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Signup error: {e}", exc_info=True)
+        logger.error("Signup error: %s", e, exc_info=True)
         raise HTTPException(status_code=400, detail=f"Signup failed: {str(e)[:100]}")
 
 @router.post("/login", response_model=AuthResponse)
 async def login(
     request: LoginRequest,
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase_auth)
 ):
     """Login user"""
     try:
-        logger.info(f"Login attempt for email: {request.email}")
-        auth_response = supabase.auth.sign_in_with_password({
+        logger.info("Login attempt for email: %s", request.email)
+        auth_response = await supabase.auth.sign_in_with_password({
             "email": request.email,
             "password": request.password
         })
         
         if not auth_response.user:
-            logger.warning(f"Login failed - invalid credentials for {request.email}")
+            logger.warning("Login failed - invalid credentials for %s", request.email)
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         # Get user profile for additional info
         profile_data = {}
         try:
-            profile_response = supabase.table("user_profiles").select("*").eq(
-                "id", auth_response.user.id
-            ).execute()
-            if profile_response.data:
-                profile_data = profile_response.data[0]
+            profile_data = await admin_profile_loader.load(auth_response.user.id) or {}
         except Exception as e:
-            logger.warning(f"Could not fetch profile: {e}")
-        
-        logger.info(f"Login successful for user {auth_response.user.id}")
+            logger.warning("Could not fetch profile: %s", e)
         
-        # Build session data
-        session_data = {}
-        if auth_response.session:
-            session_data = {
-                "access_token": auth_response.session.access_token,
-                "refresh_token": auth_response.session.refresh_token,
-                "expires_in": auth_response.session.expires_in,
-                "token_type": "bearer"
-            }
+        logger.info("Login successful for user %s", auth_response.user.id)
+        session = _session_out(auth_response.session)
         
         return AuthResponse(
             success=True,
             message="Login successful",
-            user={
-                "id": auth_response.user.id,
-                "email": auth_response.user.email,
-                "name": profile_data.get("name", ""),
-                "telegram_connected": profile_data.get("telegram_connected", False)
-            },
-            session=session_data if session_data else None
+            user=UserOut(
+                id=auth_response.user.id,
+                email=auth_response.user.email,
+                name=profile_data.get("name") or "",
+                telegram_connected=bool(profile_data.get("telegram_connected"))
+            ),
+            session=session
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}", exc_info=True)
+        logger.error("Login error: %s", e, exc_info=True)
         raise HTTPException(status_code=401, detail="Authentication failed")
 
 @router.post("/logout")
 async def logout(
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase_auth)
 ):
     """Logout user"""
     try:
-        supabase.auth.sign_out()
+        await supabase.auth.sign_out()
         return {
             "success": True,
             "message": "Logout successful"
         }
     except Exception as e:
-        logger.error(f"Logout error: {e}")
+        logger.error("Logout error: %s", e)
         raise HTTPException(status_code=400, detail="Logout failed")
 
 
@@ -179,29 +185,19 @@ async def logout(
 
 @router.get("/profile")
 async def get_profile(
-    user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    user_id: str = Depends(get_user_id)
 ):
     """Get user profile"""
     
     try:
-        # Try anon first
-        response = supabase.table("user_profiles").select("*").eq("id", user_id).execute()
-        
-        if response.data and len(response.data) > 0:
-            return response.data[0]
-        
-        # If not found with anon, try with service role
-        logger.warning(f"Profile not found with anon client, attempting with service role for user {user_id}")
-        from config import get_supabase_admin
-        admin_supabase = get_supabase_admin()
-        response = admin_supabase.table("user_profiles").select("*").eq("id", user_id).execute()
-        
-        if response.data and len(response.data) > 0:
-            return response.data[0]
+        # The shared anon client carries no user session, so RLS hides the
+        # caller's row from it; read once with the service role instead
+        profile = await admin_profile_loader.load(user_id)
+        if profile is not None:
+            return profile
         
         # Profile doesn't exist - create it with default values
-        logger.warning(f"Profile not found for user {user_id}, creating new profile with defaults")
+        logger.warning("Profile not found for user %s, creating new profile with defaults", user_id)
         profile_data = {
             "id": user_id,
             "email": "",
@@ -215,9 +211,11 @@ async def get_profile(
         }
         
         # Use admin to create profile
-        create_response = admin_supabase.table("user_profiles").insert(profile_data).execute()
+        admin_supabase = await get_supabase_admin_async()
+        create_response = await admin_supabase.table("user_profiles").insert(profile_data).execute()
         if create_response.data and len(create_response.data) > 0:
-            logger.info(f"Created default profile for user {user_id}")
+            logger.info("Created default profile for user %s", user_id)
+            invalidate_profile(user_id)
             return create_response.data[0]
         
         raise HTTPException(status_code=404, detail="Could not create or retrieve profile")
@@ -225,9 +223,9 @@ async def get_profile(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching/creating profile: {e}", exc_info=True)
+        logger.error("Error fetching/creating profile: %s", e, exc_info=True)
         # Return a default profile for development
-        if os.getenv("ENVIRONMENT") == "development":
+        if IS_DEV:
             return {
                 "id": user_id,
                 "email": "user@example.com",
@@ -250,8 +248,7 @@ class ProfileUpdate(BaseModel):
 @router.put("/profile")
 async def update_profile(
     profile_data: ProfileUpdate,
-    user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    user_id: str = Depends(get_user_id)
 ):
     """Update user profile"""
     
@@ -260,29 +257,18 @@ async def update_profile(
         if not update_dict:
             raise HTTPException(status_code=400, detail="No fields to update")
         
-        # Try with anon first
-        response = supabase.table("user_profiles").update(update_dict).eq("id", user_id).execute()
-        
-        if response.data:
-            logger.info(f"Profile updated for user {user_id}")
-            return {
-                "success": True,
-                "message": "Profile updated",
-                "profile": response.data[0] if response.data else None
-            }
-        
-        # Fallback to service role
-        logger.warning(f"Anon update failed, trying with service role for user {user_id}")
-        from config import get_supabase_admin
-        admin_supabase = get_supabase_admin()
-        response = admin_supabase.table("user_profiles").update(update_dict).eq("id", user_id).execute()
+        # Single service-role update (the anon client has no user session
+        # for RLS to match, so an anon attempt always came back empty)
+        admin_supabase = await get_supabase_admin_async()
+        response = await admin_supabase.table("user_profiles").update(update_dict).eq("id", user_id).execute()
+        invalidate_profile(user_id)
         
         if response.data:
-            logger.info(f"Profile updated with service role for user {user_id}")
+            logger.info("Profile updated for user %s", user_id)
             return {
                 "success": True,
                 "message": "Profile updated",
-                "profile": response.data[0] if response.data else None
+                "profile": response.data[0]
             }
         
         raise HTTPException(status_code=400, detail="Failed to update profile")
@@ -290,5 +276,5 @@ async def update_profile(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating profile: {e}", exc_info=True)
+        logger.error("Error updating profile: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Error updating profile")
\ No newline at end of file
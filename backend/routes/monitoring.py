@@ -3,26 +3,38 @@ Monitoring and Opik Traces Endpoint
 Provides access to AI model performance metrics and operation traces
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
-import json
+from collections import deque
+from itertools import islice
+import orjson
 
 from config import get_user_id
 from services.opik_service import OPIK_AVAILABLE
 
-router = APIRouter(tags=["monitoring"])
+router = APIRouter(tags=["monitoring"], default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
 # In-memory trace storage for demo (in production, use database or Opik backend)
 MAX_TRACES = 500
 trace_store = deque(maxlen=MAX_TRACES)
-trace_categories = defaultdict(int)
+# Per-operation shards: operation -> OperationStats for its traces still in
+# trace_store. Aggregates are updated as traces are added and evicted, so the
+# summary endpoint sums a handful of shards instead of walking the buffer
+trace_shards: Dict[str, "OperationStats"] = {}
+_recent_ts = deque(maxlen=MAX_TRACES)  # trace datetimes, oldest first, for the 24h window
 
 
 class TraceEvent:
     """Represents an operation trace"""
+    # Slots drop the per-instance __dict__ for the up-to-MAX_TRACES buffered events
+    __slots__ = (
+        "operation", "status", "model", "latency_ms", "input_data",
+        "output_data", "error", "user_id", "ts", "timestamp"
+    )
+    
     def __init__(
         self,
         operation: str,
@@ -42,7 +54,9 @@ class TraceEvent:
         self.output_data = output_data or {}
         self.error = error
         self.user_id = user_id
-        self.timestamp = datetime.utcnow().isoformat()
+        # Parsed form kept for time-window queries; ISO string for serialization
+        self.ts = datetime.utcnow()
+        self.timestamp = self.ts.isoformat()
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -58,6 +72,52 @@ class TraceEvent:
         }
 
 
+class OperationStats:
+    """Buffered traces (oldest first) and running counters for one operation"""
+    __slots__ = ("traces", "success_count", "error_count", "latency_sum", "latency_count")
+    
+    def __init__(self):
+        self.traces = deque()
+        self.success_count = 0
+        self.error_count = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+    
+    def count(self, trace: TraceEvent, sign: int):
+        """Add (sign=1) or remove (sign=-1) a trace from the counters."""
+        if trace.status == "success":
+            self.success_count += sign
+            if trace.latency_ms:
+                self.latency_sum += sign * trace.latency_ms
+                self.latency_count += sign
+                if not self.latency_count:
+                    self.latency_sum = 0.0  # drop accumulated float drift
+        elif trace.status == "error":
+            self.error_count += sign
+
+
+def _add_trace(trace: TraceEvent):
+    shard = trace_shards.get(trace.operation)
+    if shard is None:
+        shard = trace_shards[trace.operation] = OperationStats()
+    shard.traces.append(trace)
+    shard.count(trace, 1)
+
+
+def _evict_trace(trace: TraceEvent):
+    # Evicted traces are always the oldest, so they sit at the shard's left end
+    shard = trace_shards[trace.operation]
+    shard.traces.popleft()
+    shard.count(trace, -1)
+    if not shard.traces:
+        del trace_shards[trace.operation]
+
+
+def _reset_aggregates():
+    trace_shards.clear()
+    _recent_ts.clear()
+
+
 def log_trace(
     operation: str,
     status: str = "success",
@@ -82,17 +142,34 @@ def log_trace(
         error=error,
         user_id=user_id
     )
+    # deque(maxlen) drops the oldest trace silently, so uncount it first
+    if len(trace_store) == MAX_TRACES:
+        _evict_trace(trace_store[0])
     trace_store.append(trace)
-    trace_categories[operation] += 1
+    _recent_ts.append(trace.ts)
+    _add_trace(trace)
     
     # Log to file
     log_level = logging.ERROR if status == "error" else logging.INFO
     logger.log(
         log_level,
-        f"[{operation}] {status} | latency: {latency_ms}ms | model: {model}"
+        "[%s] %s | latency: %sms | model: %s",
+        operation, status, latency_ms, model
     )
 
 
+def _stream_traces(head: Dict[str, Any], traces: List[TraceEvent], tail: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    Yield {**head, "traces": [...], **tail} as JSON, serializing each trace
+    with orjson as it is sent rather than building the whole body up front.
+    """
+    yield orjson.dumps(head)[:-1] + b',"traces":['
+    for i, trace in enumerate(traces):
+        chunk = orjson.dumps(trace.to_dict(), default=str)
+        yield b"," + chunk if i else chunk
+    yield b"]," + orjson.dumps(tail)[1:]
+
+
 @router.get("/health")
 async def monitoring_health():
     """Check monitoring system status"""
@@ -124,31 +201,28 @@ async def get_traces(
         List of trace events with metadata
     """
     try:
-        traces = list(trace_store)
-        
-        # Filter by operation
+        # Buffers are append-ordered, so walking them backwards is newest
+        # first; an operation filter narrows the walk to its index entry
         if operation:
-            traces = [t for t in traces if t.operation == operation]
-        
-        # Filter by status
+            shard = trace_shards.get(operation)
+            source = shard.traces if shard else ()
+        else:
+            source = trace_store
+        candidates = reversed(source)
         if status:
-            traces = [t for t in traces if t.status == status]
-        
-        # Most recent first, limit results
-        traces = sorted(traces, key=lambda t: t.timestamp, reverse=True)[:limit]
+            candidates = (t for t in candidates if t.status == status)
+        # islice stops pulling as soon as `limit` matches are collected
+        traces = list(islice(candidates, max(limit, 0)))
         
-        return {
-            "success": True,
-            "total": len(traces),
-            "limit": limit,
-            "traces": [t.to_dict() for t in traces],
-            "filtered_by": {
-                "operation": operation,
-                "status": status
-            }
-        }
+        # Same JSON object as before, streamed one trace at a time
+        head = {"success": True, "total": len(traces), "limit": limit}
+        tail = {"filtered_by": {"operation": operation, "status": status}}
+        return StreamingResponse(
+            _stream_traces(head, traces, tail),
+            media_type="application/json"
+        )
     except Exception as e:
-        logger.error(f"Error retrieving traces: {e}")
+        logger.error("Error retrieving traces: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -159,9 +233,9 @@ async def get_traces_summary(user_id: str = Depends(get_user_id)):
     Useful for monitoring dashboard.
     """
     try:
-        traces = list(trace_store)
+        total = len(trace_store)
         
-        if not traces:
+        if not total:
             return {
                 "total_operations": 0,
                 "success_rate": 0,
@@ -170,29 +244,25 @@ async def get_traces_summary(user_id: str = Depends(get_user_id)):
                 "recent_24h": 0
             }
         
-        # Calculate statistics
-        total = len(traces)
-        successful = sum(1 for t in traces if t.status == "success")
-        success_rate = (successful / total * 100) if total > 0 else 0
+        # Statistics come from the per-operation shards maintained by log_trace
+        successful = latency_count = 0
+        latency_sum = 0.0
+        operations_by_type = {}
+        for operation, shard in trace_shards.items():
+            successful += shard.success_count
+            latency_sum += shard.latency_sum
+            latency_count += shard.latency_count
+            operations_by_type[operation] = len(shard.traces)
+        success_rate = successful / total * 100
         
         # Average latency for successful operations
-        successful_traces = [t for t in traces if t.status == "success" and t.latency_ms]
-        avg_latency = (
-            sum(t.latency_ms for t in successful_traces) / len(successful_traces)
-            if successful_traces else 0
-        )
+        avg_latency = latency_sum / latency_count if latency_count else 0
         
-        # Count by operation
-        operations_by_type = {}
-        for trace in traces:
-            operations_by_type[trace.operation] = operations_by_type.get(trace.operation, 0) + 1
-        
-        # Count recent (last 24 hours)
-        now = datetime.utcnow()
-        recent_24h = sum(
-            1 for t in traces 
-            if datetime.fromisoformat(t.timestamp) > (now - timedelta(hours=24))
-        )
+        # Count recent (last 24 hours); expired timestamps are dropped lazily
+        cutoff = datetime.utcnow() - timedelta(hours=24)
+        while _recent_ts and _recent_ts[0] <= cutoff:
+            _recent_ts.popleft()
+        recent_24h = len(_recent_ts)
         
         return {
             "total_operations": total,
@@ -203,7 +273,7 @@ async def get_traces_summary(user_id: str = Depends(get_user_id)):
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
-        logger.error(f"Error generating trace summary: {e}")
+        logger.error("Error generating trace summary: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -215,11 +285,9 @@ async def get_operation_traces(
 ):
     """Get all traces for a specific operation type"""
     try:
-        traces = [
-            t for t in trace_store 
-            if t.operation == operation_name
-        ]
-        traces = sorted(traces, key=lambda t: t.timestamp, reverse=True)[:limit]
+        # Newest first from the per-operation index, no full-buffer scan
+        shard = trace_shards.get(operation_name)
+        traces = list(islice(reversed(shard.traces), max(limit, 0))) if shard else []
         
         if not traces:
             return {
@@ -229,14 +297,18 @@ async def get_operation_traces(
                 "message": f"No traces found for operation: {operation_name}"
             }
         
-        # Calculate stats for this operation
-        successful = sum(1 for t in traces if t.status == "success")
-        failed = sum(1 for t in traces if t.status == "error")
-        successful_traces = [t for t in traces if t.status == "success" and t.latency_ms]
-        avg_latency = (
-            sum(t.latency_ms for t in successful_traces) / len(successful_traces)
-            if successful_traces else 0
-        )
+        # Calculate stats for this operation in a single pass
+        successful = failed = latency_count = 0
+        latency_sum = 0.0
+        for t in traces:
+            if t.status == "success":
+                successful += 1
+                if t.latency_ms:
+                    latency_sum += t.latency_ms
+                    latency_count += 1
+            elif t.status == "error":
+                failed += 1
+        avg_latency = latency_sum / latency_count if latency_count else 0
         
         return {
             "operation": operation_name,
@@ -248,7 +320,7 @@ async def get_operation_traces(
             "query_timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
-        logger.error(f"Error retrieving operation traces: {e}")
+        logger.error("Error retrieving operation traces: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -259,11 +331,8 @@ async def get_latest_traces(
 ):
     """Get the most recent operation traces"""
     try:
-        traces = sorted(
-            trace_store,
-            key=lambda t: t.timestamp,
-            reverse=True
-        )[:limit]
+        # Newest first without sorting (trace_store is append-ordered)
+        traces = list(islice(reversed(trace_store), max(limit, 0)))
         
         return {
             "total_available": len(trace_store),
@@ -272,7 +341,7 @@ async def get_latest_traces(
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
-        logger.error(f"Error retrieving latest traces: {e}")
+        logger.error("Error retrieving latest traces: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -282,9 +351,9 @@ async def clear_traces(user_id: str = Depends(get_user_id)):
     try:
         count = len(trace_store)
         trace_store.clear()
-        trace_categories.clear()
+        _reset_aggregates()
         
-        logger.warning(f"Traces cleared by user {user_id}. {count} traces removed.")
+        logger.warning("Traces cleared by user %s. %s traces removed.", user_id, count)
         
         return {
             "success": True,
@@ -292,9 +361,9 @@ async def clear_traces(user_id: str = Depends(get_user_id)):
             "message": f"Cleared {count} traces from storage"
         }
     except Exception as e:
-        logger.error(f"Error clearing traces: {e}")
+        logger.error("Error clearing traces: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Export
-__all__ = ["router", "log_trace", "TraceEvent", "trace_store"]
+__all__ = ["router", "log_trace", "TraceEvent", "OperationStats", "trace_store"]
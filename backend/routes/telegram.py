@@ -1,29 +1,70 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Depends
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
+import asyncio
 import httpx
+import orjson
 import os
-import re
+import base64
 import logging
-import secrets
-from datetime import datetime, timedelta
-from config import get_user_id, get_supabase
-from services.qwen_chat_service import chat_with_advisor, categorize_transaction
+import hmac
+import string
+import heapq
+import time
+from config import IS_DEV, get_user_id, get_supabase, get_supabase_admin, supabase_client
+from services.qwen_chat_service import chat_with_advisor_stream, categorize_transaction
+from services.qwen_service import parse_receipt_with_qwen
+from services.transaction_parser import parse_transaction_text
+from services.transaction_writer import submit_transaction
+from services.user_cache import invalidate_profile, invalidate_transactions
+from services.telegram_client import BOT_TOKEN, FILE_API, post_message, tg_client
 
-router = APIRouter(tags=["telegram"])
+router = APIRouter(tags=["telegram"], default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
-# Environment variables
-BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
-TELEGRAM_API = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+# setWebhook options: Telegram opens up to max_connections (default 40, max 100)
+# parallel deliveries, and echoes the secret in X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "100"))
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+_WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode()
+if not WEBHOOK_SECRET and not IS_DEV:
+    logger.warning("TELEGRAM_WEBHOOK_SECRET not set - /webhook accepts unauthenticated POSTs")
 
 # Pending link codes: code -> {telegram_id, telegram_username, first_name, expires}
 # In production, use Redis or DB
 pending_codes: dict = {}
+# Min-heap of (expires, code) so abandoned /start codes get evicted
+_code_heap: list[tuple[float, str]] = []
+CODE_TTL = 600  # seconds
 
-class TelegramUpdate(BaseModel):
-    update_id: int
-    message: dict = None
-    callback_query: dict = None
+# Caps concurrent background expense saves so a burst can't fan out unbounded
+_expense_slots = asyncio.Semaphore(50)
+
+# Streamed advice: characters before the first message, seconds between edits
+ADVICE_FIRST_CHARS = 80
+ADVICE_EDIT_INTERVAL = 1.0
+
+# The webhook's reply body never varies, so it is serialized once
+_OK_BODY = orjson.dumps({"status": "ok"})
+
+
+def _ok() -> Response:
+    """Pre-serialized {"status": "ok"}; a fresh Response each call since FastAPI attaches background tasks to it."""
+    return Response(content=_OK_BODY, media_type="application/json")
+
+
+async def _db(call):
+    """Run a blocking supabase-py .execute() in a worker thread, off the event loop."""
+    return await asyncio.to_thread(call)
+
+
+def _sweep_codes(now: float):
+    """Drop pending codes whose expiry has passed (a reissued code keeps its newer entry)."""
+    while _code_heap and _code_heap[0][0] < now:
+        _, code = heapq.heappop(_code_heap)
+        entry = pending_codes.get(code)
+        if entry and entry["expires"] < now:
+            del pending_codes[code]
 
 class VerificationRequest(BaseModel):
     telegram_id: str
@@ -43,31 +84,27 @@ async def verify_telegram_bot():
         }
     
     try:
-        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-            response = await client.get(
-                f"{TELEGRAM_API}/bot{BOT_TOKEN}/getMe",
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                bot_info = response.json()
-                result = bot_info.get("result", {})
-                # Bot username from API or env (for t.me links)
-                bot_username = result.get("username") or os.getenv("TELEGRAM_BOT_USERNAME", "")
-                return {
-                    "verified": True,
-                    "optional": False,
-                    "bot": result,
-                    "username": bot_username,
-                    "bot_username": bot_username  # for Connect button link
-                }
-            else:
-                return {
-                    "verified": False,
-                    "optional": True,
-                    "error": f"API returned {response.status_code}",
-                    "message": "Telegram verification failed, but you can still use the app."
-                }
+        response = await tg_client.get("/getMe")
+        
+        if response.status_code == 200:
+            bot_info = response.json()
+            result = bot_info.get("result", {})
+            # Bot username from API or env (for t.me links)
+            bot_username = result.get("username") or os.getenv("TELEGRAM_BOT_USERNAME", "")
+            return {
+                "verified": True,
+                "optional": False,
+                "bot": result,
+                "username": bot_username,
+                "bot_username": bot_username  # for Connect button link
+            }
+        else:
+            return {
+                "verified": False,
+                "optional": True,
+                "error": f"API returned {response.status_code}",
+                "message": "Telegram verification failed, but you can still use the app."
+            }
     except httpx.ConnectError as e:
         logger.warning(f"Telegram API connection error: {e}")
         return {
@@ -93,88 +130,123 @@ async def verify_telegram_bot():
             "message": "Telegram integration not available, but you can still use the app."
         }
 
-def _parse_transaction_text(text: str) -> tuple[str | None, float | None]:
-    """Parse 'Merchant 4500' or '4500 Merchant' or 'Food 5000 Chicken Republic' -> (merchant, amount)"""
-    text = text.strip()
-    if not text or len(text) < 3:
-        return None, None
-    # Match number (with optional decimals, commas)
-    num_pattern = r"(\d+(?:[.,]\d+)?)"
-    matches = list(re.finditer(num_pattern, text))
-    if not matches:
-        return None, None
-    # Take last number as amount (most likely total)
-    last_match = matches[-1]
-    try:
-        amount = float(last_match.group(1).replace(",", "."))
-    except ValueError:
-        return None, None
-    if amount <= 0:
-        return None, None
-    # Rest is merchant
-    merchant = (text[:last_match.start()] + text[last_match.end():]).strip()
-    merchant = re.sub(r"\s+", " ", merchant).strip()
-    if not merchant:
-        merchant = "Telegram expense"
-    return merchant, amount
+# /start reply, built once; only the name and link code vary per user
+_WELCOME_TEMPLATE = string.Template(
+    "🎉 Welcome $name! I'm Sentinel, your personal finance advisor.\n\n"
+    "💡 **What I do:**\n"
+    "• Track your daily expenses 💰\n"
+    "• Analyze spending patterns 📊\n"
+    "• Give personalized financial advice 🎯\n\n"
+    "🔗 **Link your account:**\n"
+    "Send `/link $code` (or just `$code`) to link now\n"
+    "Code expires in 10 minutes\n\n"
+    "📝 **Log expenses:**\n"
+    "• `Chicken Republic 4500`\n"
+    "• `4500 Uber`\n"
+    "• `Food 5000 Restaurant`\n\n"
+    "💬 **Ask for advice:**\n"
+    "• \"How can I save money?\"\n"
+    "• \"Am I spending too much on food?\"\n"
+    "• \"What's my spending pattern?\""
+)
+
+
+async def _handle_start(chat_id: int, text: str, user: dict, now: float):
+    """/start: issue a 6-digit link code and send the welcome message."""
+    # Generate 6-digit numeric link code for connect flow
+    # 24 random bits mod 1e6: the slight modulo bias is fine for a 10-minute code
+    code = f"{int.from_bytes(os.urandom(3), 'big') % 1_000_000:06d}"
+    pending_codes[code] = {
+        "telegram_id": chat_id,
+        "telegram_username": user.get("username"),
+        "first_name": user.get("first_name"),
+        "expires": now + CODE_TTL,
+    }
+    heapq.heappush(_code_heap, (now + CODE_TTL, code))
+    await send_message(
+        chat_id,
+        _WELCOME_TEMPLATE.substitute(name=user.get("first_name", "User"), code=code)
+    )
+
+
+async def _handle_link(chat_id: int, text: str, user: dict, now: float):
+    """/link <code>: confirm a pending link code."""
+    parts = text.split()
+    if len(parts) > 1:
+        code = parts[1]
+        if code in pending_codes:
+            entry = pending_codes[code]
+            if now <= entry["expires"]:
+                await send_message(
+                    chat_id,
+                    f"✅ Code `{code}` accepted!\n\n"
+                    f"Go to Sentinel app → Profile → Connect Telegram\n"
+                    f"and confirm to complete linking."
+                )
+                logger.info(f"User {chat_id} used /link with code {code}")
+            else:
+                del pending_codes[code]
+                await send_message(chat_id, "⏰ Code expired. Send /start for a new code.")
+            return
+    await send_message(chat_id, "Usage: `/link XXXXXX` or just send the 6-digit code")
+
+
+# First token of a message (lowercased, @BotName stripped) -> command handler
+_COMMANDS = {
+    "/start": _handle_start,
+    "/link": _handle_link,
+}
 
 
 @router.post("/webhook")
-async def telegram_webhook(update: TelegramUpdate):
+async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
     """
     Receive updates from Telegram - link accounts, log transactions, provide financial advice
     Supports: text messages, photo uploads with receipt scanning
     """
+    # Reject spoofed POSTs with one constant-time compare, before any body
+    # decoding, DB lookup or Qwen call; bytes so non-ASCII headers can't raise
+    if WEBHOOK_SECRET and not hmac.compare_digest(
+        request.headers.get("x-telegram-bot-api-secret-token", "").encode("latin-1"),
+        _WEBHOOK_SECRET_BYTES,
+    ):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    
+    # Decode the raw update with orjson; the handler only reads the untyped
+    # message dict, so model validation would be pure overhead here
     try:
-        if not update.message:
-            return {"status": "ok"}
+        update = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid update body")
+    message = update.get("message") if isinstance(update, dict) else None
+    now = time.time()
+    _sweep_codes(now)
+    
+    try:
+        if not message:
+            return _ok()
         
-        chat_id = update.message.get("chat", {}).get("id")
-        text = (update.message.get("text") or "").strip()
-        photo = update.message.get("photo")
-        user = update.message.get("from", {})
+        chat_id = message.get("chat", {}).get("id")
+        text = (message.get("text") or "").strip()
+        photo = message.get("photo")
+        user = message.get("from", {})
         
         # Handle photo uploads (receipt images)
         if photo and len(photo) > 0:
             return await _handle_receipt_photo(chat_id, photo, user)
         
-        # Handle /start command
-        if text.startswith("/start"):
-            # Generate 6-digit numeric link code for connect flow
-            code = str(secrets.randbelow(1000000)).zfill(6)
-            pending_codes[code] = {
-                "telegram_id": chat_id,
-                "telegram_username": user.get("username"),
-                "first_name": user.get("first_name"),
-                "expires": datetime.utcnow() + timedelta(minutes=10),
-            }
-            await send_message(
-                chat_id,
-                f"🎉 Welcome {user.get('first_name', 'User')}! I'm Sentinel, your personal finance advisor.\n\n"
-                f"💡 **What I do:**\n"
-                f"• Track your daily expenses 💰\n"
-                f"• Analyze spending patterns 📊\n"
-                f"• Give personalized financial advice 🎯\n\n"
-                f"🔗 **Link your account:**\n"
-                f"Send `/link {code}` (or just `{code}`) to link now\n"
-                f"Code expires in 10 minutes\n\n"
-                f"📝 **Log expenses:**\n"
-                f"• `Chicken Republic 4500`\n"
-                f"• `4500 Uber`\n"
-                f"• `Food 5000 Restaurant`\n\n"
-                f"💬 **Ask for advice:**\n"
-                f"• \"How can I save money?\"\n"
-                f"• \"Am I spending too much on food?\"\n"
-                f"• \"What's my spending pattern?\""
-            )
-            return {"status": "ok"}
+        # Bot commands: one partition + dict probe instead of prefix scans
+        command = _COMMANDS.get(text.partition(" ")[0].partition("@")[0].lower())
+        if command:
+            await command(chat_id, text, user, now)
+            return _ok()
         
         # Check if it's a 6-digit linking code
-        if text.isalnum() and len(text) == 6:
-            code = text.upper()
+        if len(text) == 6 and text.isdigit():
+            code = text
             if code in pending_codes:
                 entry = pending_codes[code]
-                if datetime.utcnow() <= entry["expires"]:
+                if now <= entry["expires"]:
                     # Valid code - but we need user_id from app, so just confirm
                     await send_message(
                         chat_id,
@@ -187,88 +259,23 @@ async def telegram_webhook(update: TelegramUpdate):
                         f"• Receive financial advice"
                     )
                     logger.info(f"User {chat_id} entered valid code {code}")
-                    return {"status": "ok"}
+                    return _ok()
                 else:
                     del pending_codes[code]
                     await send_message(chat_id, "⏰ Code expired. Send /start for a new code.")
-                    return {"status": "ok"}
-        
-        # Handle /link command with code
-        if text.startswith("/link"):
-            parts = text.split()
-            if len(parts) > 1:
-                code = parts[1].upper()
-                if code in pending_codes:
-                    entry = pending_codes[code]
-                    if datetime.utcnow() <= entry["expires"]:
-                        await send_message(
-                            chat_id,
-                            f"✅ Code `{code}` accepted!\n\n"
-                            f"Go to Sentinel app → Profile → Connect Telegram\n"
-                            f"and confirm to complete linking."
-                        )
-                        logger.info(f"User {chat_id} used /link with code {code}")
-                        return {"status": "ok"}
-                    else:
-                        del pending_codes[code]
-                        await send_message(chat_id, "⏰ Code expired. Send /start for a new code.")
-                        return {"status": "ok"}
-            await send_message(chat_id, "Usage: `/link XXXXXX` or just send the 6-digit code")
-            return {"status": "ok"}
+                    return _ok()
         
         # Try to parse as transaction amount and save to DB
-        merchant, amount = _parse_transaction_text(text)
+        merchant, amount = parse_transaction_text(text)
         if merchant and amount and amount < 1e9:  # Sanity cap
-            try:
-                supabase = get_supabase()
-                # Find user by telegram_chat_id in user_profiles
-                r = supabase.table("user_profiles").select("id, telegram_connected").eq(
-                    "telegram_chat_id", chat_id
-                ).execute()
-                if r.data and len(r.data) > 0:
-                    user_id = r.data[0]["id"]
-                    # Categorize with Qwen AI
-                    category = await categorize_transaction(merchant, "")
-                    supabase.table("transactions").insert({
-                        "user_id": user_id,
-                        "merchant": merchant,
-                        "amount": float(amount),
-                        "category": category,
-                        "description": f"Telegram: {text[:100]}",
-                        "source": "telegram",
-                        "ai_categorized": True,
-                    }).execute()
-                    await send_message(chat_id, f"✅ Logged: {merchant} – ₦{amount:,.0f} ({category})")
-                else:
-                    await send_message(
-                        chat_id,
-                        "⚠️ Account not linked.\n\n"
-                        "Send /start and enter your 6-digit code to link now 🔗"
-                    )
-            except Exception as e:
-                logger.error(f"Webhook save transaction error: {e}")
-                await send_message(chat_id, "❌ Could not save expense. Try again.")
-                return {"status": "ok"}
+            # Reply now; categorize + insert + confirmation run after the 200
+            background_tasks.add_task(_finish_expense, chat_id, merchant, amount, text)
         else:
             # Not an expense format - treat as a question and use Qwen for advice
             try:
-                supabase = get_supabase()
-                # Find user by telegram_chat_id
-                r = supabase.table("user_profiles").select("*").eq(
-                    "telegram_chat_id", chat_id
-                ).execute()
-                if r.data and len(r.data) > 0:
-                    profile = r.data[0]
-                    user_id = profile["id"]
-                    
-                    # Get recent transactions for context
-                    transactions_r = supabase.table("transactions").select("*").eq(
-                        "user_id", user_id
-                    ).order("created_at", desc=True).limit(20).execute()
-                    
-                    transactions = transactions_r.data or []
-                    total_spent = sum(float(t.get("amount", 0)) for t in transactions)
-                    
+                # Find user by telegram_chat_id, with recent transactions for context
+                profile, total_spent, transactions = await _fetch_advice_context(supabase_client(), chat_id)
+                if profile:
                     # Build context for Qwen
                     user_context = {
                         "monthlyIncome": profile.get("monthly_income", 0),
@@ -277,13 +284,12 @@ async def telegram_webhook(update: TelegramUpdate):
                         "totalSpent": total_spent,
                         "transactionSummary": "\n".join([
                             f"- {t.get('merchant', 'Unknown')}: ₦{t.get('amount', 0):,.0f} ({t.get('category', 'Other')})"
-                            for t in transactions[:5]
+                            for t in transactions
                         ]) if transactions else "No transactions yet"
                     }
                     
-                    # Get financial advice from Qwen
-                    advice = await chat_with_advisor(text, user_context)
-                    await send_message(chat_id, advice)
+                    # Stream financial advice from Qwen into the chat as it generates
+                    await _stream_advice(chat_id, text, user_context)
                 else:
                     await send_message(
                         chat_id,
@@ -300,11 +306,120 @@ async def telegram_webhook(update: TelegramUpdate):
                     "• Link account: /start"
                 )
         
-        return {"status": "ok"}
+        return _ok()
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _finish_expense(chat_id: int, merchant: str, amount: float, text: str):
+    """Categorize, save and confirm a text expense (runs as a webhook background task)."""
+    async with _expense_slots:
+        try:
+            supabase = supabase_client()
+            # Find user by telegram_chat_id in user_profiles
+            r = await _db(lambda: supabase.table("user_profiles").select("id").eq(
+                "telegram_chat_id", chat_id
+            ).limit(1).execute())
+            if r.data and len(r.data) > 0:
+                user_id = r.data[0]["id"]
+                # Categorize with Qwen AI
+                category = await categorize_transaction(merchant, "")
+                # Coalesced with concurrent expenses into one bulk insert
+                await submit_transaction({
+                    "user_id": user_id,
+                    "merchant": merchant,
+                    "amount": float(amount),
+                    "category": category,
+                    "description": f"Telegram: {text[:100]}",
+                    "source": "telegram",
+                    "ai_categorized": True,
+                })
+                invalidate_transactions(user_id)
+                await send_message(chat_id, f"✅ Logged: {merchant} – ₦{amount:,.0f} ({category})")
+            else:
+                await send_message(
+                    chat_id,
+                    "⚠️ Account not linked.\n\n"
+                    "Send /start and enter your 6-digit code to link now 🔗"
+                )
+        except Exception as e:
+            logger.error(f"Webhook save transaction error: {e}")
+            await send_message(chat_id, "❌ Could not save expense. Try again.")
+
+async def _stream_advice(chat_id: int, text: str, user_context: dict):
+    """
+    Send Qwen's advice while it generates: a first message once
+    ADVICE_FIRST_CHARS have arrived, then edits at most every
+    ADVICE_EDIT_INTERVAL seconds (Telegram allows ~1 msg/s per chat).
+    Partial text goes out plain, since half a Markdown entity is rejected;
+    the final edit applies Markdown to the complete reply, falling back to
+    plain text if the reply itself isn't valid Markdown.
+    """
+    parts: list[str] = []
+    length = 0
+    message_id = None
+    first_sent = False
+    last_edit = 0.0
+    
+    async for chunk in chat_with_advisor_stream(text, user_context):
+        parts.append(chunk)
+        length += len(chunk)
+        if not first_sent:
+            if length >= ADVICE_FIRST_CHARS:
+                first_sent = True
+                result = await send_message(chat_id, "".join(parts), parse_mode=None)
+                if result["success"]:
+                    message_id = result["result"]["result"]["message_id"]
+                    last_edit = time.monotonic()
+        elif message_id and time.monotonic() - last_edit >= ADVICE_EDIT_INTERVAL:
+            await edit_message(chat_id, message_id, "".join(parts), parse_mode=None)
+            last_edit = time.monotonic()
+    
+    advice = "".join(parts)
+    if not advice:
+        raise RuntimeError("Qwen returned an empty advice stream")
+    # Model output can carry unbalanced Markdown; resend plain if Telegram rejects it
+    if message_id:
+        result = await edit_message(chat_id, message_id, advice)
+        if not result["success"]:
+            await edit_message(chat_id, message_id, advice, parse_mode=None)
+    else:
+        result = await send_message(chat_id, advice)
+        if not result["success"]:
+            await send_message(chat_id, advice, parse_mode=None)
+
+async def _fetch_advice_context(supabase, chat_id: int):
+    """
+    Linked profile, total of the last 20 transactions and the 5 most recent
+    for a chat, in one round-trip via the get_telegram_chat_context RPC
+    (database/get_telegram_chat_context.sql); Postgres computes the sum.
+    Falls back to the two separate queries if the function isn't deployed.
+    """
+    try:
+        response = await _db(
+            lambda: supabase.rpc("get_telegram_chat_context", {"chat_id": chat_id}).execute()
+        )
+        data = response.data or {}
+        return data.get("profile"), float(data.get("total_spent") or 0), data.get("transactions") or []
+    except Exception as e:
+        logger.debug(f"get_telegram_chat_context RPC unavailable, using separate queries: {e}")
+
+    r = await _db(
+        lambda: supabase.table("user_profiles").select(
+            "id, monthly_income, fixed_bills, savings_goal"
+        ).eq("telegram_chat_id", chat_id).limit(1).execute()
+    )
+    if not r.data:
+        return None, 0.0, []
+    profile = r.data[0]
+    transactions_r = await _db(
+        lambda: supabase.table("transactions").select(
+            "merchant, amount, category"
+        ).eq("user_id", profile["id"]).order("created_at", desc=True).limit(20).execute()
+    )
+    transactions = transactions_r.data or []
+    return profile, sum(float(t.get("amount") or 0) for t in transactions), transactions[:5]
+
 async def _handle_receipt_photo(chat_id: int, photo: list, user: dict):
     """Handle receipt photo uploads - extract data using OCR and Qwen"""
     try:
@@ -316,30 +431,26 @@ async def _handle_receipt_photo(chat_id: int, photo: list, user: dict):
         
         if not file_id:
             await send_message(chat_id, "❌ Could not extract photo. Try uploading a clearer image.")
-            return {"status": "ok"}
+            return _ok()
         
         # Download photo from Telegram
         file_info_response = await _get_telegram_file(file_id)
         if not file_info_response or not file_info_response.get("result"):
             await send_message(chat_id, "❌ Could not download photo from Telegram.")
-            return {"status": "ok"}
+            return _ok()
         
         file_path = file_info_response["result"].get("file_path")
-        file_url = f"{TELEGRAM_API}/file/bot{BOT_TOKEN}/{file_path}"
         
         # Download and parse receipt with Qwen
-        logger.info(f"Downloading receipt from Telegram: {file_url}")
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            image_response = await client.get(file_url)
-            image_data = image_response.content
+        logger.info(f"Downloading receipt from Telegram: {file_path}")
+        image_response = await tg_client.get(FILE_API + file_path, timeout=30.0)
+        image_data = image_response.content
         
         # Encode to base64 for Qwen processing
-        import base64
         base64_image = base64.b64encode(image_data).decode('utf-8')
         receipt_data_uri = f"data:image/jpeg;base64,{base64_image}"
         
         # Parse receipt with Qwen
-        from services.qwen_service import parse_receipt_with_qwen
         extracted_data = await parse_receipt_with_qwen(receipt_data_uri)
         
         # Validate extraction
@@ -352,15 +463,15 @@ async def _handle_receipt_photo(chat_id: int, photo: list, user: dict):
                 "• Take a straight-on photo\n"
                 "• Or log manually: `Merchant 5000`"
             )
-            return {"status": "ok"}
+            return _ok()
         
         # Save to database
         try:
-            supabase = get_supabase()
+            supabase = supabase_client()
             # Find user by telegram_chat_id
-            user_r = supabase.table("user_profiles").select("id").eq(
+            user_r = await _db(lambda: supabase.table("user_profiles").select("id").eq(
                 "telegram_chat_id", chat_id
-            ).execute()
+            ).limit(1).execute())
             
             if not user_r.data or len(user_r.data) == 0:
                 await send_message(
@@ -368,7 +479,7 @@ async def _handle_receipt_photo(chat_id: int, photo: list, user: dict):
                     "⚠️ Account not linked.\n\n"
                     "Send /start and enter your 6-digit code to link now 🔗"
                 )
-                return {"status": "ok"}
+                return _ok()
             
             user_id = user_r.data[0]["id"]
             
@@ -386,9 +497,9 @@ async def _handle_receipt_photo(chat_id: int, photo: list, user: dict):
             }
             
             # Use service role for insert
-            from config import get_supabase_admin
             admin_supabase = get_supabase_admin()
-            result = admin_supabase.table("transactions").insert(transaction_data).execute()
+            result = await _db(lambda: admin_supabase.table("transactions").insert(transaction_data).execute())
+            invalidate_transactions(user_id)
             
             if result.data:
                 merchant = extracted_data.get("merchant", "Unknown")
@@ -408,22 +519,21 @@ async def _handle_receipt_photo(chat_id: int, photo: list, user: dict):
             logger.error(f"Error saving receipt from Telegram: {db_error}")
             await send_message(chat_id, "❌ Database error. Please try again.")
         
-        return {"status": "ok"}
+        return _ok()
         
     except Exception as e:
         logger.error(f"Receipt photo handler error: {e}", exc_info=True)
         await send_message(chat_id, "❌ Error processing receipt. Please try again.")
-        return {"status": "ok"}
+        return _ok()
 
 async def _get_telegram_file(file_id: str):
     """Get file info from Telegram"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{TELEGRAM_API}/bot{BOT_TOKEN}/getFile",
-                params={"file_id": file_id}
-            )
-            return response.json()
+        response = await tg_client.get(
+            "/getFile",
+            params={"file_id": file_id}
+        )
+        return response.json()
     except Exception as e:
         logger.error(f"Error getting Telegram file: {e}")
         return None
@@ -436,30 +546,44 @@ async def send_telegram_message(
     """Send message to user"""
     return await send_message(chat_id, message)
 
-async def send_message(chat_id: int | str, text: str):
+async def send_message(chat_id: int | str, text: str, parse_mode: str | None = "Markdown"):
     """Helper function to send messages"""
     if not BOT_TOKEN:
         return {"success": False, "error": "Bot not configured"}
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{TELEGRAM_API}/bot{BOT_TOKEN}/sendMessage",
-                json={
-                    "chat_id": chat_id,
-                    "text": text,
-                    "parse_mode": "Markdown"
-                }
-            )
-            
-            if response.status_code == 200:
-                return {"success": True, "result": response.json()}
-            else:
-                return {"success": False, "error": response.text}
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        response = await post_message("/sendMessage", payload)
+        
+        if response.status_code == 200:
+            return {"success": True, "result": response.json()}
+        else:
+            return {"success": False, "error": response.text}
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         return {"success": False, "error": str(e)}
 
+async def edit_message(chat_id: int | str, message_id: int, text: str, parse_mode: str | None = "Markdown"):
+    """Replace the text of a message the bot already sent"""
+    if not BOT_TOKEN:
+        return {"success": False, "error": "Bot not configured"}
+    
+    try:
+        payload = {"chat_id": chat_id, "message_id": message_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        response = await post_message("/editMessageText", payload)
+        
+        if response.status_code == 200:
+            return {"success": True, "result": response.json()}
+        else:
+            return {"success": False, "error": response.text}
+    except Exception as e:
+        logger.error(f"Error editing message: {e}")
+        return {"success": False, "error": str(e)}
+
 @router.post("/link-with-code")
 async def link_with_code(
     request: LinkWithCodeRequest,
@@ -468,13 +592,15 @@ async def link_with_code(
 ):
     """Link Telegram to user using code from /start in bot"""
     try:
-        code = (request.code or "").strip().upper()
+        code = (request.code or "").strip()
+        now = time.time()
+        _sweep_codes(now)
         if len(code) < 4:
             return {"success": False, "error": "Invalid code"}
         entry = pending_codes.get(code)
         if not entry:
             return {"success": False, "error": "Code expired or invalid. Send /start in Telegram for a new code."}
-        if datetime.utcnow() > entry["expires"]:
+        if now > entry["expires"]:
             del pending_codes[code]
             return {"success": False, "error": "Code expired. Send /start in Telegram for a new code."}
         telegram_id = entry["telegram_id"]
@@ -483,11 +609,12 @@ async def link_with_code(
         
         # Update user_profiles with telegram link
         logger.info(f"Linking telegram_id {telegram_id} to user {user_id}")
-        supabase.table("user_profiles").update({
+        await _db(lambda: supabase.table("user_profiles").update({
             "telegram_chat_id": telegram_id,
             "telegram_connected": True,
             "telegram_username": telegram_username,
-        }).eq("id", user_id).execute()
+        }).eq("id", user_id).execute())
+        invalidate_profile(user_id)
         
         # Send confirmation message
         try:
@@ -519,7 +646,7 @@ async def link_with_code(
 async def link_telegram_account(request: VerificationRequest):
     """Legacy: link by telegram_id (use link-with-code for new flow)"""
     try:
-        supabase = get_supabase()
+        supabase = supabase_client()
         # Would need user_id - this endpoint is for backwards compat
         return {"success": False, "error": "Use /link-with-code with the code from the bot"}
     except Exception as e:
@@ -544,19 +671,20 @@ async def link_direct_admin(
         if not request.telegram_id or not request.user_id:
             return {"success": False, "error": "Missing telegram_id or user_id"}
         
-        supabase = get_supabase()
+        supabase = supabase_client()
         
         # Verify user exists
-        user_check = supabase.table("user_profiles").select("id").eq("id", request.user_id).execute()
+        user_check = await _db(lambda: supabase.table("user_profiles").select("id").eq("id", request.user_id).execute())
         if not user_check.data:
             return {"success": False, "error": "User not found"}
         
         # Update telegram link
         logger.info(f"Direct linking telegram {request.telegram_id} to user {request.user_id}")
-        supabase.table("user_profiles").update({
+        await _db(lambda: supabase.table("user_profiles").update({
             "telegram_chat_id": request.telegram_id,
             "telegram_connected": True,
-        }).eq("id", request.user_id).execute()
+        }).eq("id", request.user_id).execute())
+        invalidate_profile(request.user_id)
         
         logger.info(f"Successfully linked telegram {request.telegram_id} to user {request.user_id}")
         return {
@@ -574,9 +702,9 @@ async def link_direct_admin(
 async def check_telegram_link(telegram_id: str, supabase = Depends(get_supabase)):
     """Check if Telegram account is linked to any user"""
     try:
-        r = supabase.table("user_profiles").select("id").eq(
+        r = await _db(lambda: supabase.table("user_profiles").select("id").eq(
             "telegram_chat_id", telegram_id
-        ).execute()
+        ).limit(1).execute())
         is_linked = bool(r.data and len(r.data) > 0)
         return {"linked": is_linked}
     except Exception as e:
@@ -605,56 +733,60 @@ async def setup_telegram_webhook(request_body: dict = None):
     full_webhook_url = f"{webhook_url}/api/telegram/webhook"
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{TELEGRAM_API}/bot{BOT_TOKEN}/setWebhook",
-                json={
-                    "url": full_webhook_url,
-                    "allowed_updates": ["message", "callback_query"]
-                }
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("ok"):
-                    logger.info(f"✅ Telegram webhook configured: {full_webhook_url}")
-                    
-                    # Also get webhook info to confirm
-                    info_response = await client.get(
-                        f"{TELEGRAM_API}/bot{BOT_TOKEN}/getWebhookInfo"
-                    )
-                    
-                    webhook_info = {}
-                    if info_response.status_code == 200:
-                        info_data = info_response.json()
-                        if info_data.get("ok"):
-                            webhook_info = info_data.get("result", {})
-                    
-                    return {
-                        "success": True,
-                        "message": "Webhook configured successfully",
-                        "webhook_url": full_webhook_url,
-                        "webhook_info": {
-                            "url": webhook_info.get("url"),
-                            "pending_updates": webhook_info.get("pending_update_count", 0),
-                            "last_error": webhook_info.get("last_error_message")
-                        }
-                    }
-                else:
-                    error_msg = result.get("description", "Unknown error")
-                    logger.error(f"Webhook setup error: {error_msg}")
-                    return {
-                        "success": False,
-                        "error": error_msg
+        response = await tg_client.post(
+            "/setWebhook",
+            json={
+                "url": full_webhook_url,
+                "allowed_updates": ["message", "callback_query"],
+                "max_connections": WEBHOOK_MAX_CONNECTIONS,
+                "drop_pending_updates": False,
+                **({"secret_token": WEBHOOK_SECRET} if WEBHOOK_SECRET else {}),
+            },
+            timeout=30.0
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("ok"):
+                logger.info(f"✅ Telegram webhook configured: {full_webhook_url}")
+                
+                # Also get webhook info to confirm
+                info_response = await tg_client.get(
+                    "/getWebhookInfo",
+                    timeout=30.0
+                )
+                
+                webhook_info = {}
+                if info_response.status_code == 200:
+                    info_data = info_response.json()
+                    if info_data.get("ok"):
+                        webhook_info = info_data.get("result", {})
+                
+                return {
+                    "success": True,
+                    "message": "Webhook configured successfully",
+                    "webhook_url": full_webhook_url,
+                    "webhook_info": {
+                        "url": webhook_info.get("url"),
+                        "pending_updates": webhook_info.get("pending_update_count", 0),
+                        "last_error": webhook_info.get("last_error_message")
                     }
+                }
             else:
-                logger.error(f"Telegram API error {response.status_code}")
+                error_msg = result.get("description", "Unknown error")
+                logger.error(f"Webhook setup error: {error_msg}")
                 return {
                     "success": False,
-                    "error": f"Telegram API returned {response.status_code}",
-                    "detail": response.text
+                    "error": error_msg
                 }
-                
+        else:
+            logger.error(f"Telegram API error {response.status_code}")
+            return {
+                "success": False,
+                "error": f"Telegram API returned {response.status_code}",
+                "detail": response.text
+            }
+            
     except httpx.ConnectError as e:
         logger.error(f"Cannot connect to Telegram API: {e}")
         return {
@@ -680,31 +812,31 @@ async def get_webhook_info():
         }
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                f"{TELEGRAM_API}/bot{BOT_TOKEN}/getWebhookInfo"
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("ok"):
-                    info = result.get("result", {})
-                    return {
-                        "configured": True,
-                        "webhook": {
-                            "url": info.get("url", "Not set"),
-                            "has_custom_certificate": info.get("has_custom_certificate", False),
-                            "pending_update_count": info.get("pending_update_count", 0),
-                            "last_error_message": info.get("last_error_message"),
-                            "last_error_date": info.get("last_error_date")
-                        }
+        response = await tg_client.get(
+            "/getWebhookInfo",
+            timeout=30.0
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("ok"):
+                info = result.get("result", {})
+                return {
+                    "configured": True,
+                    "webhook": {
+                        "url": info.get("url", "Not set"),
+                        "has_custom_certificate": info.get("has_custom_certificate", False),
+                        "pending_update_count": info.get("pending_update_count", 0),
+                        "last_error_message": info.get("last_error_message"),
+                        "last_error_date": info.get("last_error_date")
                     }
-            
-            return {
-                "configured": False,
-                "error": "Could not get webhook info"
-            }
-            
+                }
+        
+        return {
+            "configured": False,
+            "error": "Could not get webhook info"
+        }
+        
     except Exception as e:
         logger.error(f"Error getting webhook info: {e}")
         return {
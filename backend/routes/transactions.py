@@ -2,17 +2,22 @@ from fastapi import APIRouter, HTTPException, Depends, Query, File, UploadFile
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
-from config import get_supabase, get_user_id
+from config import get_user_id
 import logging
-from supabase import Client
-import base64
 from io import BytesIO
+import hashlib
 import time
+import asyncpg
+from db.pool import get_db
 from routes.monitoring import log_trace
+from services.user_cache import invalidate_transactions, receipt_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Receipt photos from phone cameras are a few MB; anything larger is rejected
+MAX_RECEIPT_BYTES = 10 * 1024 * 1024
+
 class TransactionCreate(BaseModel):
     merchant: str
     amount: float
@@ -29,11 +34,22 @@ class TransactionUpdate(BaseModel):
     date: Optional[str] = None
     currency: Optional[str] = None
 
+# Updatable columns -> SQL cast for their $n parameter. Amounts go over the
+# wire as float8 and dates as ISO strings; Postgres casts both on assignment.
+_UPDATE_CASTS = {
+    "merchant": "",
+    "amount": "::float8",
+    "category": "",
+    "description": "",
+    "date": "::text::timestamptz",
+    "currency": "",
+}
+
 # FIXED: Removed duplicate route decorator
 @router.get("/")
 async def get_transactions(
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase),
+    conn: asyncpg.Connection = Depends(get_db),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0)
 ):
@@ -41,29 +57,14 @@ async def get_transactions(
     try:
         logger.info(f"🔍 Fetching transactions for user: {user_id}, limit: {limit}, offset: {offset}")
         
-        # Try with anon client first (respects RLS)
-        response = None
-        try:
-            response = supabase.table("transactions").select(
-                "*"
-            ).eq("user_id", user_id).order("created_at", desc=True).range(offset, offset + limit - 1).execute()
-            
-            if response.data and len(response.data) > 0:
-                logger.info(f"✅ Anon client returned {len(response.data)} transactions for user {user_id}")
-                return response.data
-        except Exception as anon_error:
-            logger.warning(f"⚠️ Anon client failed, trying service role: {anon_error}")
-        
-        # Fallback: use service role client (bypasses RLS)
-        from config import get_supabase_admin
-        admin_supabase = get_supabase_admin()
-        response = admin_supabase.table("transactions").select(
-            "*"
-        ).eq("user_id", user_id).order("created_at", desc=True).range(offset, offset + limit - 1).execute()
-        
-        logger.info(f"✅ Service role returned {len(response.data) if response.data else 0} transactions for user {user_id}")
-        
-        return response.data or []
+        rows = await conn.fetch(
+            "SELECT * FROM transactions WHERE user_id = $1 "
+            "ORDER BY created_at DESC LIMIT $2 OFFSET $3",
+            user_id, limit, offset
+        )
+        
+        logger.info(f"✅ Returned {len(rows)} transactions for user {user_id}")
+        return [dict(row) for row in rows]
         
     except Exception as e:
         logger.error(f"❌ Database error fetching transactions for user {user_id}: {e}", exc_info=True)
@@ -74,66 +75,65 @@ async def get_transactions(
 async def get_transaction(
     transaction_id: str,
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Get a single transaction"""
     try:
-        # Try with anon client first
-        try:
-            response = supabase.table("transactions").select(
-                "*"
-            ).eq("id", transaction_id).eq("user_id", user_id).single().execute()
-            
-            if response.data:
-                return response.data
-        except Exception as anon_error:
-            logger.warning(f"Anon client failed for transaction {transaction_id}, trying service role: {anon_error}")
-        
-        # Fallback to service role client
-        from config import get_supabase_admin
-        admin_supabase = get_supabase_admin()
-        response = admin_supabase.table("transactions").select(
-            "*"
-        ).eq("id", transaction_id).eq("user_id", user_id).single().execute()
-        
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        return response.data
-        
-    except HTTPException:
-        raise
+        row = await conn.fetchrow(
+            "SELECT * FROM transactions WHERE id = $1 AND user_id = $2",
+            transaction_id, user_id
+        )
+    except asyncpg.DataError:
+        # Malformed UUID
+        raise HTTPException(status_code=404, detail="Transaction not found")
     except Exception as e:
         logger.error(f"Error fetching transaction: {e}")
         raise HTTPException(status_code=500, detail="Error fetching transaction")
+    
+    if row is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    return dict(row)
 
 # FIXED: Removed duplicate route decorator
 @router.post("/receipt-upload")
 async def upload_receipt(
     file: UploadFile = File(...),
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Upload a receipt image and extract transaction data using Gemini Vision"""
     start_time = time.time()
     try:
-        # Read file contents
-        contents = await file.read()
-        
-        if not contents:
-            raise HTTPException(status_code=400, detail="Empty file")
-        
         # Validate file type
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Encode to base64
-        base64_image = base64.b64encode(contents).decode('utf-8')
-        image_data = f"data:{file.content_type};base64,{base64_image}"
+        if file.size is not None and file.size > MAX_RECEIPT_BYTES:
+            raise HTTPException(status_code=413, detail="Receipt image too large")
         
-        # Use Gemini to parse receipt
-        from services.gemini_service import parse_receipt
-        extracted_data = await parse_receipt(image_data)
+        # Read file contents
+        contents = await file.read()
+        
+        if not contents:
+            raise HTTPException(status_code=400, detail="Empty file")
+        if len(contents) > MAX_RECEIPT_BYTES:
+            raise HTTPException(status_code=413, detail="Receipt image too large")
+        
+        # Identical re-uploads reuse the earlier extraction instead of calling Gemini
+        cache_key = (user_id, hashlib.sha256(contents).digest())
+        extracted_data = receipt_cache.get(cache_key)
+        cache_hit = extracted_data is not None
+        if not cache_hit:
+            # Use Gemini to parse receipt; the raw bytes go inline, no base64 copy
+            from services.gemini_service import parse_receipt
+            extracted_data = await parse_receipt(contents, mime_type=file.content_type)
+            # Fallback extractions (unparseable model reply) are not cached, so a re-upload retries
+            if (
+                extracted_data.get("merchant") not in ("Unknown", "Unknown Merchant")
+                and extracted_data.get("amount")
+            ):
+                receipt_cache[cache_key] = extracted_data
         
         # Create transaction in database
         transaction_date = extracted_data.get("date") or datetime.utcnow().isoformat()
@@ -143,33 +143,24 @@ async def upload_receipt(
         if len(currency) != 3:
             currency = "NGN"
         
-        data = {
-            "user_id": user_id,
-            "merchant": extracted_data.get("merchant", "Unknown Merchant"),
-            "amount": float(extracted_data.get("amount", 0)),
-            "category": extracted_data.get("category", "Other"),
-            "description": extracted_data.get("description", ""),
-            "date": transaction_date,
-            "currency": currency,
-            "source": "receipt",
-            "ai_categorized": True,
-            "created_at": datetime.utcnow().isoformat()
-        }
+        row = await conn.fetchrow(
+            """
+            INSERT INTO transactions
+                (user_id, merchant, amount, category, description, date, currency, source, ai_categorized)
+            VALUES ($1, $2, $3::float8, $4, $5, $6::text::timestamptz, $7, 'receipt', TRUE)
+            RETURNING *
+            """,
+            user_id,
+            extracted_data.get("merchant", "Unknown Merchant"),
+            float(extracted_data.get("amount", 0)),
+            extracted_data.get("category", "Other"),
+            extracted_data.get("description", ""),
+            transaction_date,
+            currency,
+        )
         
-        # Try with anon first, fallback to service role
-        response = None
-        try:
-            response = supabase.table("transactions").insert(data).execute()
-            if not response.data or len(response.data) == 0:
-                raise Exception("Anon insert returned no data")
-        except Exception as anon_error:
-            logger.warning(f"Anon insert failed for receipt, trying with service role: {anon_error}")
-            from config import get_supabase_admin
-            admin_supabase = get_supabase_admin()
-            response = admin_supabase.table("transactions").insert(data).execute()
-        
-        if not response.data or len(response.data) == 0:
-            logger.error(f"Supabase insert failed for user {user_id}: {response}")
+        if row is None:
+            logger.error(f"Insert returned no row for receipt, user {user_id}")
             # Log trace for failed receipt
             latency_ms = (time.time() - start_time) * 1000
             log_trace(
@@ -183,7 +174,8 @@ async def upload_receipt(
             )
             raise HTTPException(status_code=400, detail="Failed to create transaction from receipt")
         
-        created_transaction = response.data[0]
+        invalidate_transactions(user_id)
+        created_transaction = dict(row)
         logger.info(f"Receipt processed for user {user_id}: {created_transaction.get('id')}")
         
         # Log successful trace
@@ -194,7 +186,11 @@ async def upload_receipt(
             model="Gemini Vision",
             latency_ms=latency_ms,
             input_data={"merchant": extracted_data.get("merchant"), "file": file.filename},
-            output_data={"transaction_id": created_transaction.get("id"), "amount": created_transaction.get("amount")},
+            output_data={
+                "transaction_id": str(created_transaction.get("id")),
+                "amount": created_transaction.get("amount"),
+                "cache_hit": cache_hit
+            },
             user_id=user_id
         )
         
@@ -215,7 +211,7 @@ async def upload_receipt(
 async def create_transaction(
     transaction: TransactionCreate,
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Create a new transaction"""
     start_time = time.time()
@@ -236,54 +232,23 @@ async def create_transaction(
             currency = "NGN"
         currency = currency.upper()
         
-        data = {
-            "user_id": user_id,
-            "merchant": transaction.merchant.strip(),
-            "amount": float(transaction.amount),
-            "category": transaction.category or "Other",
-            "description": (transaction.description or "").strip(),
-            "date": transaction_date,
-            "currency": currency,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        logger.debug(f"Transaction data prepared: {data}")
+        row = await conn.fetchrow(
+            """
+            INSERT INTO transactions (user_id, merchant, amount, category, description, date, currency)
+            VALUES ($1, $2, $3::float8, $4, $5, $6::text::timestamptz, $7)
+            RETURNING *
+            """,
+            user_id,
+            transaction.merchant.strip(),
+            float(transaction.amount),
+            transaction.category or "Other",
+            (transaction.description or "").strip(),
+            transaction_date,
+            currency,
+        )
         
-        # Try with anon client first (respects RLS)
-        try:
-            logger.info(f"Attempting to insert with anon client for user {user_id}")
-            response = supabase.table("transactions").insert(data).execute()
-            if response.data and len(response.data) > 0:
-                created_transaction = response.data[0]
-                logger.info(f"Transaction created successfully (anon) for user {user_id}: {created_transaction.get('id')}")
-                
-                # Log successful trace
-                latency_ms = (time.time() - start_time) * 1000
-                log_trace(
-                    operation="transaction_create",
-                    status="success",
-                    model="Manual",
-                    latency_ms=latency_ms,
-                    input_data={"merchant": transaction.merchant, "amount": transaction.amount, "currency": currency},
-                    output_data={"transaction_id": created_transaction.get("id"), "category": created_transaction.get("category")},
-                    user_id=user_id
-                )
-                
-                return {
-                    "success": True,
-                    "transaction": created_transaction
-                }
-        except Exception as anon_error:
-            logger.warning(f"Anon insert failed for user {user_id}, trying with service role: {anon_error}")
-            
-            # Fallback to service role client (bypasses RLS)
-            from config import get_supabase_admin
-            admin_supabase = get_supabase_admin()
-            logger.info(f"Attempting to insert with service role client for user {user_id}")
-            response = admin_supabase.table("transactions").insert(data).execute()
-        
-        if not response.data or len(response.data) == 0:
-            logger.error(f"Supabase insert failed for user {user_id}: {response}")
+        if row is None:
+            logger.error(f"Insert returned no row for user {user_id}")
             # Log trace for failed transaction
             latency_ms = (time.time() - start_time) * 1000
             log_trace(
@@ -297,8 +262,9 @@ async def create_transaction(
             )
             raise HTTPException(status_code=400, detail="Failed to create transaction")
         
-        created_transaction = response.data[0]
-        logger.info(f"Transaction created successfully (service role fallback) for user {user_id}: {created_transaction.get('id')}")
+        invalidate_transactions(user_id)
+        created_transaction = dict(row)
+        logger.info(f"Transaction created successfully for user {user_id}: {created_transaction.get('id')}")
         
         # Log successful trace
         latency_ms = (time.time() - start_time) * 1000
@@ -308,7 +274,7 @@ async def create_transaction(
             model="Manual",
             latency_ms=latency_ms,
             input_data={"merchant": transaction.merchant, "amount": transaction.amount, "currency": currency},
-            output_data={"transaction_id": created_transaction.get("id"), "category": created_transaction.get("category")},
+            output_data={"transaction_id": str(created_transaction.get("id")), "category": created_transaction.get("category")},
             user_id=user_id
         )
         
@@ -328,37 +294,16 @@ async def update_transaction(
     transaction_id: str,
     transaction: TransactionUpdate,
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Update a transaction"""
     try:
-        # Verify ownership - try with anon client first
-        existing = None
-        try:
-            existing = supabase.table("transactions").select(
-                "id"
-            ).eq("id", transaction_id).eq("user_id", user_id).single().execute()
-            
-            if existing.data:
-                logger.info(f"Anon client verified ownership of transaction {transaction_id}")
-        except Exception as anon_error:
-            logger.warning(f"Anon client failed to verify ownership, trying service role: {anon_error}")
-            # Try with service role as fallback
-            from config import get_supabase_admin
-            admin_supabase = get_supabase_admin()
-            existing = admin_supabase.table("transactions").select(
-                "id"
-            ).eq("id", transaction_id).eq("user_id", user_id).single().execute()
-        
-        if not existing or not existing.data:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
         # Prepare update data (only non-None values)
         update_data = {}
         if transaction.merchant is not None:
             update_data["merchant"] = transaction.merchant
         if transaction.amount is not None:
-            update_data["amount"] = transaction.amount
+            update_data["amount"] = float(transaction.amount)
         if transaction.category is not None:
             update_data["category"] = transaction.category
         if transaction.description is not None:
@@ -374,14 +319,26 @@ async def update_transaction(
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
         
-        # Use service role for update to ensure it works
-        from config import get_supabase_admin
-        admin_supabase = get_supabase_admin()
-        response = admin_supabase.table("transactions").update(update_data).eq("id", transaction_id).execute()
+        # Ownership is part of the WHERE clause, so no separate lookup is needed
+        assignments = ", ".join(
+            f"{column} = ${i}{_UPDATE_CASTS[column]}"
+            for i, column in enumerate(update_data, start=3)
+        )
+        try:
+            row = await conn.fetchrow(
+                f"UPDATE transactions SET {assignments} WHERE id = $1 AND user_id = $2 RETURNING *",
+                transaction_id, user_id, *update_data.values()
+            )
+        except asyncpg.DataError:
+            row = None  # Malformed UUID
+        
+        if row is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        invalidate_transactions(user_id)
         
         return {
             "success": True,
-            "transaction": response.data[0] if response.data else None
+            "transaction": dict(row)
         }
         
     except HTTPException:
@@ -394,35 +351,21 @@ async def update_transaction(
 async def delete_transaction(
     transaction_id: str,
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Delete a transaction"""
     try:
-        # Verify ownership - try with anon client first
-        existing = None
         try:
-            existing = supabase.table("transactions").select(
-                "id"
-            ).eq("id", transaction_id).eq("user_id", user_id).single().execute()
-            
-            if existing.data:
-                logger.info(f"Anon client verified ownership of transaction {transaction_id}")
-        except Exception as anon_error:
-            logger.warning(f"Anon client failed to verify ownership, trying service role: {anon_error}")
-            # Try with service role as fallback
-            from config import get_supabase_admin
-            admin_supabase = get_supabase_admin()
-            existing = admin_supabase.table("transactions").select(
-                "id"
-            ).eq("id", transaction_id).eq("user_id", user_id).single().execute()
-        
-        if not existing or not existing.data:
-            raise HTTPException(status_code=404, detail="Transaction not found")
+            deleted = await conn.fetchval(
+                "DELETE FROM transactions WHERE id = $1 AND user_id = $2 RETURNING id",
+                transaction_id, user_id
+            )
+        except asyncpg.DataError:
+            deleted = None  # Malformed UUID
         
-        # Use service role for delete to ensure it works
-        from config import get_supabase_admin
-        admin_supabase = get_supabase_admin()
-        admin_supabase.table("transactions").delete().eq("id", transaction_id).execute()
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        invalidate_transactions(user_id)
         
         return {
             "success": True,
@@ -438,15 +381,18 @@ async def delete_transaction(
 @router.get("/stats/summary")
 async def get_transaction_stats(
     user_id: str = Depends(get_user_id),
-    supabase: Client = Depends(get_supabase)
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Get transaction statistics"""
     try:
-        transactions = supabase.table("transactions").select(
-            "amount, category, date"
-        ).eq("user_id", user_id).execute()
+        # Aggregated in Postgres: one row per category instead of every transaction
+        rows = await conn.fetch(
+            "SELECT COALESCE(category, 'Other') AS category, SUM(amount)::float8 AS total, COUNT(*) AS count "
+            "FROM transactions WHERE user_id = $1 GROUP BY 1",
+            user_id
+        )
         
-        if not transactions.data:
+        if not rows:
             return {
                 "total_spent": 0,
                 "transaction_count": 0,
@@ -454,19 +400,15 @@ async def get_transaction_stats(
                 "by_category": {}
             }
         
-        transactions_list = transactions.data
-        total_spent = sum(t["amount"] for t in transactions_list)
-        
-        # Group by category
-        by_category = {}
-        for t in transactions_list:
-            category = t.get("category", "Other")
-            by_category[category] = by_category.get(category, 0) + t["amount"]
+        # NULL categories are grouped under 'Other' in SQL, so keys never collide
+        by_category = {row["category"]: row["total"] for row in rows}
+        total_spent = sum(row["total"] for row in rows)
+        transaction_count = sum(row["count"] for row in rows)
         
         return {
             "total_spent": total_spent,
-            "transaction_count": len(transactions_list),
-            "average_transaction": total_spent / len(transactions_list),
+            "transaction_count": transaction_count,
+            "average_transaction": total_spent / transaction_count,
             "by_category": by_category
         }
         
@@ -123,7 +123,8 @@ async def generate_financial_advice(
     supabase: Client,
     monthly_income: float,
     fixed_bills: float,
-    savings_goal: float
+    savings_goal: float,
+    analysis: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Generate personalized financial advice based on spending patterns.
@@ -134,13 +135,16 @@ async def generate_financial_advice(
         monthly_income: Monthly income
         fixed_bills: Monthly fixed bills
         savings_goal: Desired monthly savings
+        analysis: Precomputed 1-month analyze_spending_patterns result, if the
+            caller already has one
         
     Returns:
         Dictionary with advice and recommendations
     """
     try:
-        # Analyze spending
-        analysis = await analyze_spending_patterns(user_id, supabase, months=1)
+        # Analyze spending (reuse the caller's analysis when provided)
+        if analysis is None:
+            analysis = await analyze_spending_patterns(user_id, supabase, months=1)
         
         advice = {
             "summary": "",
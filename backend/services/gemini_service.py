@@ -1,8 +1,9 @@
 import os
+import asyncio
 import logging
 import base64
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from PIL import Image
 from io import BytesIO
 from config import Config
@@ -17,18 +18,23 @@ genai.configure(api_key=Config.GEMINI_API_KEY)
 VISION_MODEL = "gemini-2.0-flash"
 CHAT_MODEL = "gemini-2.5-flash"
 
+# Cap on concurrent Vision calls; excess receipt parses wait for a slot
+GEMINI_MAX_INFLIGHT = int(os.getenv("GEMINI_MAX_INFLIGHT", "8"))
+_vision_slots = asyncio.Semaphore(GEMINI_MAX_INFLIGHT)
+
 # Categories for expense classification
 CATEGORIES = [
     "Food", "Transport", "Entertainment", "Shopping", 
     "Bills", "Utilities", "Health", "Education", "Other"
 ]
 
-async def parse_receipt(image_source: str) -> Dict[str, Any]:
+async def parse_receipt(image_source: Union[str, bytes], mime_type: str = "image/jpeg") -> Dict[str, Any]:
     """
     Parse receipt image and extract transaction details using Gemini Vision 1.5 Flash.
     
     Args:
-        image_source: Either base64 encoded image or URL
+        image_source: Raw image bytes, a base64 data URL, or a URL
+        mime_type: Content type of raw image bytes
         
     Returns:
         Dict with merchant, amount, date, items, category, description
@@ -37,7 +43,10 @@ async def parse_receipt(image_source: str) -> Dict[str, Any]:
         model = genai.GenerativeModel(VISION_MODEL)
         
         # Prepare image data
-        if image_source.startswith("data:image"):
+        if isinstance(image_source, bytes):
+            # Raw upload: sent as an inline blob part, the SDK encodes it once
+            image = {"mime_type": mime_type, "data": image_source}
+        elif image_source.startswith("data:image"):
             # Handle base64 encoded image
             header, data = image_source.split(",", 1)
             image_data = base64.b64decode(data)
@@ -78,7 +87,9 @@ CRITICAL RULES:
 
 Return ONLY JSON, no explanations or markdown."""
         
-        response = model.generate_content([extraction_prompt, image])
+        # generate_content is blocking, so it runs in a worker thread
+        async with _vision_slots:
+            response = await asyncio.to_thread(model.generate_content, [extraction_prompt, image])
         
         # Parse response
         response_text = response.text.strip()
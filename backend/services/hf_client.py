@@ -0,0 +1,52 @@
+"""
+Shared HuggingFace router clients.
+Every Qwen call goes through one sync and one async OpenAI-compatible client,
+so all services reuse the same keep-alive connection pools.
+"""
+
+import os
+import logging
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+# HuggingFace API Configuration
+HF_TOKEN = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_API_TOKEN")
+if not HF_TOKEN:
+    logger.warning("HF_TOKEN/HUGGINGFACE_API_TOKEN not configured")
+
+HF_BASE_URL = "https://router.huggingface.co/v1"
+
+# Sized for receipt batches and concurrent chats hitting the same host
+HF_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+
+# Sync client (run from worker threads) pointing to HuggingFace router
+try:
+    client = OpenAI(
+        base_url=HF_BASE_URL,
+        api_key=HF_TOKEN,
+        http_client=httpx.Client(limits=HF_LIMITS),
+    )
+except Exception as e:
+    logger.warning(f"Failed to initialize HF client: {e}")
+    client = None
+
+# Async client for streaming responses
+try:
+    async_client = AsyncOpenAI(
+        base_url=HF_BASE_URL,
+        api_key=HF_TOKEN,
+        http_client=httpx.AsyncClient(limits=HF_LIMITS),
+    )
+except Exception as e:
+    logger.warning(f"Failed to initialize async HF client: {e}")
+    async_client = None
+
+
+async def close_hf_clients():
+    """Close the shared connection pools on shutdown."""
+    if async_client:
+        await async_client.close()
+    if client:
+        client.close()
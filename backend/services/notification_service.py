@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from enum import Enum
 from supabase import Client
 from config import Config
-import httpx
+from services.telegram_client import post_message
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +75,26 @@ async def send_notification(
         return False
 
 
+async def send_bulk(coros, limit: int = 20) -> List[Any]:
+    """
+    Await many send coroutines concurrently, at most `limit` at a time.
+    
+    Args:
+        coros: Iterable of send_* coroutines
+        limit: Maximum concurrent sends (caps Telegram API fan-out)
+        
+    Returns:
+        Results in input order; exceptions are returned, not raised
+    """
+    sem = asyncio.Semaphore(limit)
+    
+    async def guarded(coro):
+        async with sem:
+            return await coro
+    
+    return await asyncio.gather(*(guarded(c) for c in coros), return_exceptions=True)
+
+
 async def send_telegram_notification(
     user_id: str,
     title: str,
@@ -112,25 +132,22 @@ async def send_telegram_notification(
             logger.error("TELEGRAM_BOT_TOKEN not configured")
             return False
         
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
+        # Shared keep-alive client (base_url is the bot's API URL), rate limited
+        response = await post_message(
+            "/sendMessage",
+            {
+                "chat_id": telegram_chat_id,
+                "text": formatted_message,
+                "parse_mode": "Markdown"
+            }
+        )
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                json={
-                    "chat_id": telegram_chat_id,
-                    "text": formatted_message,
-                    "parse_mode": "Markdown"
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Telegram notification sent to user {user_id}")
-                return True
-            else:
-                logger.error(f"Telegram API error: {response.status_code} - {response.text}")
-                return False
+        if response.status_code == 200:
+            logger.info(f"Telegram notification sent to user {user_id}")
+            return True
+        else:
+            logger.error(f"Telegram API error: {response.status_code} - {response.text}")
+            return False
         
     except Exception as e:
         logger.error(f"Error sending Telegram notification: {e}")
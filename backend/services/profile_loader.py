@@ -0,0 +1,87 @@
+"""
+DataLoader-style coalescer for user_profiles reads.
+Profile lookups arriving within a short window are collected and served by
+a single select(...).in_("id", ids) query instead of one request each.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from config import get_supabase_admin_async
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 100
+BATCH_WINDOW = 0.01  # seconds
+
+
+class ProfileLoader:
+    """
+    Batch concurrent profile reads made through one async Supabase client.
+    load() resolves to the user_profiles row, or None if it isn't visible.
+    """
+
+    def __init__(
+        self,
+        get_client: Callable[[], Awaitable],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        batch_window: float = BATCH_WINDOW
+    ):
+        self._get_client = get_client
+        self._max_batch_size = max_batch_size
+        self._batch_window = batch_window
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()  # strong refs so batches aren't GC'd
+
+    async def load(self, user_id: str) -> Optional[dict]:
+        """Queue user_id for the next batch and wait for its row."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(user_id, []).append(future)
+
+        if len(self._pending) >= self._max_batch_size:
+            if self._flush_task:
+                self._flush_task.cancel()
+                self._flush_task = None
+            self._dispatch()
+        elif self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_later())
+
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self._batch_window)
+        self._flush_task = None
+        self._dispatch()
+
+    def _dispatch(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._fetch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _fetch(self, batch: Dict[str, List[asyncio.Future]]):
+        try:
+            client = await self._get_client()
+            response = await client.table("user_profiles").select("*").in_(
+                "id", list(batch)
+            ).execute()
+            rows = {row["id"]: row for row in response.data or []}
+            logger.debug("Profile batch: %s ids, %s rows", len(batch), len(rows))
+            for user_id, futures in batch.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(rows.get(user_id))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+# Service-role loader; callers filter by the authenticated user's id
+admin_profile_loader = ProfileLoader(get_supabase_admin_async)
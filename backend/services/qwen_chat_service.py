@@ -4,26 +4,14 @@
 import os
 import logging
 import json
-from typing import Dict, Any, Optional, List
-from openai import OpenAI
+from typing import Dict, Any, AsyncIterator, Optional, List
 from datetime import datetime
+from cachetools import LRUCache
 
 logger = logging.getLogger(__name__)
 
-# HuggingFace API Configuration
-HF_TOKEN = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_API_TOKEN")
-if not HF_TOKEN:
-    logger.warning("HF_TOKEN/HUGGINGFACE_API_TOKEN not configured")
-
-# Initialize OpenAI client pointing to HuggingFace router
-try:
-    client = OpenAI(
-        base_url="https://router.huggingface.co/v1",
-        api_key=HF_TOKEN,
-    )
-except Exception as e:
-    logger.warning(f"Failed to initialize HF client: {e}")
-    client = None
+# Shared HuggingFace router clients (one connection pool per process)
+from services.hf_client import async_client
 
 # Qwen model identifier
 MODEL_ID = "Qwen/Qwen2.5-7B-Instruct:together"
@@ -34,37 +22,27 @@ CATEGORIES = [
     "Bills", "Utilities", "Health", "Education", "Other"
 ]
 
-async def chat_with_advisor(
+# (merchant, description) -> category. Classification runs at temperature 0,
+# so repeat merchants ("Uber", "Chicken Republic") skip the LLM round-trip
+_category_cache: LRUCache = LRUCache(maxsize=4096)
+
+def _build_advisor_messages(
     user_message: str,
     user_context: Dict[str, Any],
     conversation_history: list = None
-) -> str:
-    """
-    Chat with financial advisor using Qwen 2.5 7B model.
-    Provides personalized financial advice based on spending patterns.
-    Args:
-        user_message: User's question or message
-        user_context: User's financial context (spending, income, goals)
-        conversation_history: Previous messages for context
-    Returns:
-        Advisor's response
-    """
-    try:
-        if not client:
-            logger.error("HuggingFace client not initialized - HF_TOKEN missing")
-            return "❌ AI service not configured. Please set HF_TOKEN environment variable."
-
-        # Build conversation context
-        history_text = ""
-        if conversation_history:
-            for msg in conversation_history[-5:]:  # Last 5 messages for context
-                role = "User" if msg.get("role") == "user" else "Advisor"
-                history_text += f"{role}: {msg.get('content', '')}\n"
+) -> List[Dict[str, str]]:
+    """Build the system + user messages for the financial advisor prompt."""
+    # Build conversation context
+    history_text = ""
+    if conversation_history:
+        for msg in conversation_history[-5:]:  # Last 5 messages for context
+            role = "User" if msg.get("role") == "user" else "Advisor"
+            history_text += f"{role}: {msg.get('content', '')}\n"
 
-        tx_summary = user_context.get("transactionSummary", "")
+    tx_summary = user_context.get("transactionSummary", "")
 
-        # System prompt for financial advisor (refined for brevity)
-        system_prompt = f"""You are Sentinel, a friendly financial advisor AI.
+    # System prompt for financial advisor (refined for brevity)
+    system_prompt = f"""You are Sentinel, a friendly financial advisor AI.
 User's Financial Profile:
 - Monthly Income: ₦{user_context.get('monthlyIncome', 0):,.0f}
 - Fixed Bills (monthly): ₦{user_context.get('fixedBills', 0):,.0f}
@@ -86,19 +64,41 @@ Previous conversation:
 {history_text}
 Respond briefly to: {user_message}"""
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+async def chat_with_advisor(
+    user_message: str,
+    user_context: Dict[str, Any],
+    conversation_history: list = None
+) -> str:
+    """
+    Chat with financial advisor using Qwen 2.5 7B model.
+    Provides personalized financial advice based on spending patterns.
+    Args:
+        user_message: User's question or message
+        user_context: User's financial context (spending, income, goals)
+        conversation_history: Previous messages for context
+    Returns:
+        Advisor's response
+    """
+    try:
+        if not async_client:
+            logger.error("HuggingFace client not initialized - HF_TOKEN missing")
+            return "❌ AI service not configured. Please set HF_TOKEN environment variable."
+
         # Call Qwen API with text generation (reduced max_tokens for conciseness)
         api_payload = {
             "model": MODEL_ID,
             "temperature": 0.7,
             "max_tokens": 150,  # Reduced for shorter responses
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
+            "messages": _build_advisor_messages(user_message, user_context, conversation_history)
         }
 
         logger.info(f"Calling Qwen for chat: {user_message[:50]}...")
-        completion = client.chat.completions.create(**api_payload)
+        completion = await async_client.chat.completions.create(**api_payload)
         response_text = completion.choices[0].message.content
         logger.info(f"Qwen response received: {len(response_text)} chars")
         return response_text
@@ -107,6 +107,35 @@ Respond briefly to: {user_message}"""
         logger.error(f"Error in Qwen chat: {e}", exc_info=True)
         return f"⚠️ Error: {str(e)[:100]}. Try again."
 
+async def chat_with_advisor_stream(
+    user_message: str,
+    user_context: Dict[str, Any],
+    conversation_history: list = None
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of chat_with_advisor: yields text chunks as Qwen
+    generates them. Closing the generator closes the upstream stream.
+    """
+    if not async_client:
+        logger.error("HuggingFace client not initialized - HF_TOKEN missing")
+        yield "❌ AI service not configured. Please set HF_TOKEN environment variable."
+        return
+
+    logger.info(f"Streaming Qwen chat: {user_message[:50]}...")
+    stream = await async_client.chat.completions.create(
+        model=MODEL_ID,
+        temperature=0.7,
+        max_tokens=150,
+        messages=_build_advisor_messages(user_message, user_context, conversation_history),
+        stream=True
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
 async def categorize_transaction(merchant: str, description: str) -> str:
     """
     Categorize a transaction based on merchant and description using Qwen.
@@ -116,8 +145,13 @@ async def categorize_transaction(merchant: str, description: str) -> str:
     Returns:
         Category from CATEGORIES list
     """
+    key = (" ".join(merchant.lower().split()), " ".join((description or "").lower().split()))
+    cached = _category_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        if not client:
+        if not async_client:
             logger.warning("HuggingFace client not initialized")
             return "Other"
 
@@ -127,7 +161,7 @@ Description: {description}
 Categories: {", ".join(CATEGORIES)}
 Respond with ONLY the category name."""
 
-        completion = client.chat.completions.create(
+        completion = await async_client.chat.completions.create(
             model=MODEL_ID,
             messages=[{"role": "user", "content": categorization_prompt}],
             max_tokens=10,  # Reduced for brevity
@@ -136,8 +170,11 @@ Respond with ONLY the category name."""
 
         category = completion.choices[0].message.content.strip()
         if category not in CATEGORIES:
+            # Fallbacks are not cached, so the next call asks the model again
             logger.warning(f"Invalid category '{category}', defaulting to 'Other'")
             return "Other"
+        # Only valid classifications are cached; errors fall through below
+        _category_cache[key] = category
         return category
 
     except Exception as e:
@@ -161,7 +198,7 @@ async def analyze_spending_pattern(
         Dict with insights, risks, and recommendations
     """
     try:
-        if not client or not transactions:
+        if not async_client or not transactions:
             return {
                 "insights": ["Log more transactions for analysis"],
                 "risk_level": "unknown",
@@ -195,7 +232,7 @@ Respond with JSON ONLY:
     "recommendations": ["rec 1", "rec 2"]
 }}"""
 
-        completion = client.chat.completions.create(
+        completion = await async_client.chat.completions.create(
             model=MODEL_ID,
             messages=[{"role": "user", "content": analysis_prompt}],
             max_tokens=200,  # Reduced for conciseness
@@ -1,13 +1,13 @@
 import os
 import logging
+import asyncio
 import base64
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from PIL import Image
 from io import BytesIO
 import requests
 from config import Config
-from openai import OpenAI
 import pytesseract
 from services.opik_service import monitor_qwen_call, OPIK_AVAILABLE, OPIK_CONFIGURED
 
@@ -27,33 +27,24 @@ if os.path.exists(TESSERACT_CMD):
 else:
     logger.warning(f"⚠️ Static tesseract not found at {TESSERACT_CMD}, using system tesseract")
 
-# HuggingFace API Configuration
-HF_TOKEN = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_API_TOKEN")
-if not HF_TOKEN:
-    logger.warning("HF_TOKEN/HUGGINGFACE_API_TOKEN not configured")
-
-# Initialize OpenAI client pointing to HuggingFace router
-try:
-    client = OpenAI(
-        base_url="https://router.huggingface.co/v1",
-        api_key=HF_TOKEN,
-    )
-except Exception as e:
-    logger.warning(f"Failed to initialize HF client: {e}")
-    client = None
+# Shared HuggingFace router client (one connection pool per process)
+from services.hf_client import client
 
 # Qwen model identifier (TEXT-ONLY - NO VISION SUPPORT!)
 MODEL_ID = "Qwen/Qwen2.5-7B-Instruct:together"
 
 # OCR module - extract text from images since Qwen doesn't support vision
-def extract_text_from_image(image_source: str) -> str:
+def extract_text_from_image(image_source: Union[str, bytes]) -> str:
     """
     Extract text from image using Tesseract OCR.
-    Supports base64 encoded images and URLs.
+    Supports raw image bytes, base64 encoded images and URLs.
     """
     try:
         # Handle different image formats
-        if image_source.startswith('http'):
+        if isinstance(image_source, bytes):
+            # Raw upload bytes - decoded directly, no base64 round-trip
+            image = Image.open(BytesIO(image_source))
+        elif image_source.startswith('http'):
             # Download image from URL
             logger.info(f"Downloading image from URL: {image_source[:50]}...")
             response = requests.get(image_source, timeout=10)
@@ -79,6 +70,12 @@ def extract_text_from_image(image_source: str) -> str:
         return ""
 
 
+def _source_type(image_source: Union[str, bytes]) -> str:
+    if isinstance(image_source, bytes):
+        return "bytes"
+    return "url" if image_source.startswith('http') else "base64"
+
+
 # Categories for expense classification
 CATEGORIES = [
     "Food", "Transport", "Entertainment", "Shopping", 
@@ -86,9 +83,10 @@ CATEGORIES = [
 ]
 
 
-async def parse_receipt_with_qwen(image_source: str) -> Dict[str, Any]:
+def _parse_receipt_sync(image_source: Union[str, bytes]) -> Dict[str, Any]:
     """
     Parse receipt image using OCR + Qwen text analysis.
+    Blocking (Tesseract + sync HF client); callers run it on a worker thread.
     
     IMPORTANT: Qwen2.5-7B on HuggingFace router does NOT support vision/image inputs.
     Solution: Extract text using Tesseract OCR, then analyze the text with Qwen.
@@ -103,7 +101,7 @@ async def parse_receipt_with_qwen(image_source: str) -> Dict[str, Any]:
             logger.error("No image source provided")
             return _get_default_extraction()
         
-        logger.info(f"Processing receipt image, source type: {'url' if image_source.startswith('http') else 'base64'}")
+        logger.info(f"Processing receipt image, source type: {_source_type(image_source)}")
         
         # Step 1: Extract text from image using OCR
         ocr_text = extract_text_from_image(image_source)
@@ -198,6 +196,11 @@ CRITICAL INSTRUCTIONS:
         return _get_default_extraction()
 
 
+async def parse_receipt_with_qwen(image_source: Union[str, bytes]) -> Dict[str, Any]:
+    """Parse a single receipt without blocking the event loop."""
+    return await asyncio.to_thread(_parse_receipt_sync, image_source)
+
+
 async def analyze_transaction_with_qwen(
     merchant: str,
     amount: float,
@@ -0,0 +1,50 @@
+"""
+In-flight deduplication for receipt parsing.
+Identical images (by blake2b hash) share one in-flight parse_receipt_with_qwen
+call and its recently cached result.
+"""
+
+import asyncio
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Dict, Tuple, Union
+
+from services.qwen_service import parse_receipt_with_qwen, _get_default_extraction
+
+# image hash -> (expiry, parse task); LRU-ordered, failed parses are evicted
+RESULT_TTL = 300
+MAX_CACHED_RESULTS = 1024
+_results: "OrderedDict[bytes, Tuple[float, asyncio.Task]]" = OrderedDict()
+_FAILED_EXTRACTION = _get_default_extraction()
+
+
+async def submit_receipt(image_source: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    Parse a receipt, reusing the in-flight or recent result for an identical
+    image. The parse task is shielded, so a disconnecting caller doesn't
+    cancel it for others waiting on the same image.
+    """
+    data = image_source if isinstance(image_source, bytes) else image_source.encode()
+    key = blake2b(data, digest_size=16).digest()
+    loop = asyncio.get_running_loop()
+    
+    entry = _results.get(key)
+    if entry is not None and entry[0] > loop.time():
+        _results.move_to_end(key)
+        return await asyncio.shield(entry[1])
+    
+    task = asyncio.ensure_future(parse_receipt_with_qwen(image_source))
+    _results[key] = (loop.time() + RESULT_TTL, task)
+    _results.move_to_end(key)
+    if len(_results) > MAX_CACHED_RESULTS:
+        _results.popitem(last=False)
+    task.add_done_callback(lambda t: _evict_failed(key, t))
+    return await asyncio.shield(task)
+
+
+def _evict_failed(key: bytes, task: asyncio.Task):
+    """Drop errored or fallback results so a retry re-parses the image."""
+    failed = task.cancelled() or task.exception() is not None or task.result() == _FAILED_EXTRACTION
+    entry = _results.get(key)
+    if failed and entry is not None and entry[1] is task:
+        del _results[key]
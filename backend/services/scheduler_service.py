@@ -7,11 +7,12 @@ from typing import Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
-from config import get_supabase
+from config import supabase_client
 from services.notification_service import (
     send_health_tip,
     send_weekly_summary,
-    send_spending_insight
+    send_spending_insight,
+    send_bulk
 )
 from services.financial_advice_service import (
     analyze_spending_patterns,
@@ -76,7 +77,7 @@ def initialize_scheduler():
 async def send_daily_health_tips():
     """Send daily health tips to all users."""
     try:
-        supabase = get_supabase()
+        supabase = supabase_client()
         
         # Get all users
         users_response = supabase.table("user_profiles").select("id").execute()
@@ -110,47 +111,56 @@ async def send_daily_health_tips():
         logger.error(f"Error in send_daily_health_tips: {e}")
 
 
-async def send_weekly_summaries():
-    """Send weekly spending summaries to all users."""
+async def _send_user_weekly_summary(user_id: str, supabase) -> bool:
+    """Analyze one user's week and send their summary."""
     try:
-        supabase = get_supabase()
+        # Get spending analysis
+        analysis = await analyze_spending_patterns(user_id, supabase, months=1)
+        
+        total_spent = analysis.get("total_spent", 0)
+        avg_daily = (total_spent / 7) if analysis.get("total_transactions", 0) > 0 else 0
+        category_breakdown = analysis.get("category_breakdown", {})
+        
+        # Send summary
+        return await send_weekly_summary(
+            user_id,
+            total_spent,
+            avg_daily,
+            category_breakdown,
+            supabase
+        )
+    except Exception as e:
+        logger.error(f"Error sending weekly summary to user {user_id}: {e}")
+        return False
+
+
+async def send_weekly_summaries() -> int:
+    """Send weekly spending summaries to all users. Returns the number sent."""
+    try:
+        supabase = supabase_client()
         
         # Get all users
         users_response = supabase.table("user_profiles").select("id").execute()
         users = users_response.data or []
         
-        for user in users:
-            try:
-                user_id = user["id"]
-                
-                # Get spending analysis
-                analysis = await analyze_spending_patterns(user_id, supabase, months=1)
-                
-                total_spent = analysis.get("total_spent", 0)
-                avg_daily = (total_spent / 7) if analysis.get("total_transactions", 0) > 0 else 0
-                category_breakdown = analysis.get("category_breakdown", {})
-                
-                # Send summary
-                await send_weekly_summary(
-                    user_id,
-                    total_spent,
-                    avg_daily,
-                    category_breakdown,
-                    supabase
-                )
-            except Exception as e:
-                logger.error(f"Error sending weekly summary to user {user['id']}: {e}")
+        # Fan out with bounded concurrency instead of one user at a time
+        results = await send_bulk(
+            _send_user_weekly_summary(user["id"], supabase) for user in users
+        )
+        sent = sum(1 for r in results if r is True)
         
-        logger.info(f"Weekly summaries sent to {len(users)} users")
+        logger.info(f"Weekly summaries sent to {sent}/{len(users)} users")
+        return sent
         
     except Exception as e:
         logger.error(f"Error in send_weekly_summaries: {e}")
+        return 0
 
 
 async def check_budget_status():
     """Check budget status and send alerts if needed."""
     try:
-        supabase = get_supabase()
+        supabase = supabase_client()
         
         # Get all users with budget info
         users_response = supabase.table("user_profiles").select(
@@ -195,7 +205,7 @@ async def check_budget_status():
 async def send_monthly_assessment():
     """Send monthly financial health assessment."""
     try:
-        supabase = get_supabase()
+        supabase = supabase_client()
         
         # Get all users
         users_response = supabase.table("user_profiles").select(
@@ -0,0 +1,101 @@
+"""
+Shared Telegram Bot API client.
+One keep-alive connection pool to the Bot API for the webhook handlers and
+notification senders, closed on app shutdown. Outbound messages are paced
+to the Bot API limits (~30 msg/s per bot, 1 msg/s per chat).
+"""
+
+import os
+import time
+import asyncio
+import logging
+import httpx
+import orjson
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+
+# File downloads live outside the /bot<token> prefix; built once at import
+FILE_API = f"{TELEGRAM_API}/file/bot{BOT_TOKEN}/"
+
+# Sized for webhook bursts and bulk notification fan-out
+TELEGRAM_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=200)
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
+# Requests use Bot API method paths relative to the bot URL, e.g. "/sendMessage"
+tg_client = httpx.AsyncClient(
+    base_url=f"{TELEGRAM_API}/bot{BOT_TOKEN}",
+    timeout=10.0,
+    limits=TELEGRAM_LIMITS,
+)
+
+
+async def close_telegram_client():
+    """Close the shared connection pool on shutdown."""
+    await tg_client.aclose()
+
+
+# ==================== RATE LIMITING ====================
+
+class TokenBucket:
+    """Async token bucket: `rate` sends per `period` seconds, bursting up to `rate`."""
+
+    __slots__ = ("rate", "period", "_tokens", "_updated", "_lock")
+
+    def __init__(self, rate: int, period: float = 1.0):
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it (FIFO via the lock)."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.period / self.rate)
+
+
+_global_bucket = TokenBucket(30)
+# Per-chat buckets expire so idle chats don't accumulate
+_chat_buckets: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+
+async def throttle(chat_id):
+    """Wait for both the per-chat and the global send budget."""
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = _chat_buckets[chat_id] = TokenBucket(1)
+    await bucket.acquire()
+    await _global_bucket.acquire()
+
+
+async def post_message(path: str, payload: dict) -> httpx.Response:
+    """
+    POST a sendMessage-style call under the rate limits.
+    The body is encoded once with orjson (and reused on retry) instead of
+    httpx's stdlib json. On a 429 the call is retried once after
+    Telegram's retry_after.
+    """
+    body = orjson.dumps(payload)
+    await throttle(payload.get("chat_id"))
+    response = await tg_client.post(path, content=body, headers=_JSON_HEADERS)
+    if response.status_code == 429:
+        try:
+            retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+        except ValueError:
+            retry_after = 1
+        logger.warning(f"Telegram rate limited, retrying in {retry_after}s")
+        await asyncio.sleep(retry_after)
+        response = await tg_client.post(path, content=body, headers=_JSON_HEADERS)
+    return response
@@ -6,6 +6,7 @@ import logging
 from typing import Dict, Any, Optional
 from supabase import Client
 from config import Config
+from services.user_cache import invalidate_profile
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +71,7 @@ async def update_telegram_settings(
         response = supabase.table("user_profiles").update({
             "telegram_chat_id": telegram_chat_id
         }).eq("id", user_id).execute()
+        invalidate_profile(user_id)
         
         if response.data:
             return {
@@ -106,6 +108,7 @@ async def disconnect_telegram(user_id: str, supabase: Client) -> Dict[str, Any]:
         response = supabase.table("user_profiles").update({
             "telegram_chat_id": None
         }).eq("id", user_id).execute()
+        invalidate_profile(user_id)
         
         if response.data:
             return {
@@ -0,0 +1,60 @@
+"""
+Expense text parser for the Telegram webhook.
+Kept in its own fully typed module with no third-party imports so it can be
+compiled with mypyc (see Dockerfile); the pure-Python file is the fallback.
+"""
+
+from typing import Final, FrozenSet, Optional, Tuple
+
+_DIGITS: Final[FrozenSet[str]] = frozenset("0123456789")
+
+
+def parse_transaction_text(text: str) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Parse 'Merchant 4500' or '4500 Merchant' or 'Food 5000 Chicken Republic' -> (merchant, amount)
+
+    The amount is the last \\d+(?:[.,]\\d+)? token a left-to-right scan would find:
+
+    >>> parse_transaction_text("Chicken Republic 4500")
+    ('Chicken Republic', 4500.0)
+    >>> parse_transaction_text("Uber 2,5")
+    ('Uber', 2.5)
+    >>> parse_transaction_text("X 1,500,000")
+    (None, None)
+    >>> parse_transaction_text("abc 1.2.3")
+    ('abc 1.2.', 3.0)
+    """
+    text = text.strip()
+    if not text or len(text) < 3:
+        return None, None
+    # Take last number as amount (most likely total): walk back from the end,
+    # skip the non-digit tail, then walk the chain of digit groups joined by
+    # single [.,]. Left to right the regex pairs groups up (1,2 | 3,4 | 5), so
+    # the last token spans two groups only when the chain has an even count.
+    i: int = len(text) - 1
+    while i >= 0 and text[i] not in _DIGITS:
+        i -= 1
+    if i < 0:
+        return None, None
+    end: int = i + 1
+    while i >= 0 and text[i] in _DIGITS:
+        i -= 1
+    last_start: int = i + 1
+    prev_start: int = last_start
+    groups: int = 1
+    while i > 0 and text[i] in ".," and text[i - 1] in _DIGITS:
+        i -= 1
+        while i >= 0 and text[i] in _DIGITS:
+            i -= 1
+        groups += 1
+        if groups == 2:
+            prev_start = i + 1
+    start: int = prev_start if groups % 2 == 0 else last_start
+    amount: float = float(text[start:end].replace(",", "."))
+    if amount <= 0:
+        return None, None
+    # Rest is merchant
+    merchant: str = " ".join((text[:start] + text[end:]).split())
+    if not merchant:
+        merchant = "Telegram expense"
+    return merchant, amount
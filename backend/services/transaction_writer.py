@@ -0,0 +1,113 @@
+"""
+Coalescing writer for transaction inserts.
+Rows submitted within a short window are written with one bulk
+supabase.table("transactions").insert([...]) call; each submitter waits
+for its batch. If the bulk insert fails, the rows are retried one at a
+time so only the offending row's caller sees the error.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+from config import supabase_client
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 50
+MAX_WAIT_MS = 200
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+_inflight: Set[asyncio.Task] = set()  # strong refs so dispatched batches aren't GC'd
+
+
+def start_transaction_writer():
+    """Create the queue and start the flush worker on the running event loop."""
+    global _queue, _worker
+    _queue = asyncio.Queue()
+    _worker = asyncio.create_task(_run_worker(_queue))
+    logger.info("Transaction writer started (max_batch=%s, max_wait_ms=%s)", MAX_BATCH, MAX_WAIT_MS)
+
+
+async def stop_transaction_writer():
+    """Flush queued rows and stop the worker; later rows are inserted directly."""
+    global _queue, _worker
+    queue, worker = _queue, _worker
+    _queue = None
+    _worker = None
+    if worker:
+        queue.put_nowait(None)  # sentinel: dispatch the batch in progress, then exit
+        await worker
+    if _inflight:
+        await asyncio.gather(*_inflight, return_exceptions=True)
+
+
+async def submit_transaction(row: Dict[str, Any]):
+    """Queue a transactions row for the next bulk insert and wait until it is written."""
+    if _queue is None:
+        await _insert([row])
+        return
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put((row, future))
+    await future
+
+
+async def _insert(rows):
+    await asyncio.to_thread(lambda: supabase_client().table("transactions").insert(rows).execute())
+
+
+async def _run_worker(queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        # Block for the first row, then gather more until the batch is full
+        # or the wait window closes
+        item = await queue.get()
+        if item is None:
+            return
+        batch = [item]
+        deadline = loop.time() + MAX_WAIT_MS / 1000
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+
+        # Dispatch without awaiting so the next batch can start collecting
+        task = asyncio.create_task(_dispatch(batch))
+        _inflight.add(task)
+        task.add_done_callback(_inflight.discard)
+
+
+async def _dispatch(batch):
+    try:
+        await _insert([row for row, _ in batch])
+    except Exception as e:
+        if len(batch) == 1:
+            _resolve(batch[0][1], e)
+            return
+        # One bad row fails the whole statement; isolate it by retrying singly
+        logger.warning("Transaction batch of %s failed, retrying rows individually: %s", len(batch), e)
+        await asyncio.gather(*(_dispatch([item]) for item in batch))
+        return
+
+    for _, future in batch:
+        _resolve(future)
+
+
+def _resolve(future: asyncio.Future, error: Optional[Exception] = None):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        logger.error("Transaction insert failed: %s", error)
+        future.set_exception(error)
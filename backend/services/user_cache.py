@@ -0,0 +1,40 @@
+"""
+Per-user TTL caches for slowly-changing data read on hot paths
+(chat context, Telegram settings). Writers call the invalidate_* helpers
+so the next read goes back to Supabase. Caches are only touched from the
+event loop thread, so no locking is needed.
+
+The caches are per process. Under gunicorn's multiple workers an
+invalidate_* call only clears the worker that handled the write, so the
+others can serve data up to one TTL old; TTLs are kept to a few seconds
+to bound that staleness.
+"""
+
+from cachetools import TTLCache
+
+# user_id -> user_profiles row (monthly_income, fixed_bills, savings_goal)
+profile_cache = TTLCache(maxsize=10_000, ttl=10)
+
+# user_id -> GET /api/ai/telegram/settings response
+telegram_cache = TTLCache(maxsize=10_000, ttl=10)
+
+# user_ids with no user_profiles row (negative cache; skips the admin retry)
+missing_profile_cache = TTLCache(maxsize=10_000, ttl=10)
+
+# user_id -> last 20 transactions (merchant, amount, category)
+recent_transactions_cache = TTLCache(maxsize=10_000, ttl=5)
+
+# (user_id, sha256 of the image) -> Gemini receipt extraction; re-uploads skip the model
+receipt_cache = TTLCache(maxsize=2_048, ttl=86_400)
+
+
+def invalidate_profile(user_id: str):
+    """Drop cached profile-derived data after a user_profiles write."""
+    profile_cache.pop(user_id, None)
+    telegram_cache.pop(user_id, None)
+    missing_profile_cache.pop(user_id, None)
+
+
+def invalidate_transactions(user_id: str):
+    """Drop the cached recent-transactions list after a transactions write."""
+    recent_transactions_cache.pop(user_id, None)
@@ -15,6 +15,8 @@ load_dotenv()
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 BACKEND_URL = os.getenv("BACKEND_WEBHOOK_URL", "https://sentinel-o0yb.onrender.com")
 TELEGRAM_API = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "100"))
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
 
 def setup_webhook():
     """Setup Telegram webhook to receive updates"""
@@ -36,7 +38,10 @@ def setup_webhook():
             f"{TELEGRAM_API}/bot{BOT_TOKEN}/setWebhook",
             json={
                 "url": webhook_url,
-                "allowed_updates": ["message", "callback_query"]
+                "allowed_updates": ["message", "callback_query"],
+                "max_connections": MAX_CONNECTIONS,
+                "drop_pending_updates": False,
+                **({"secret_token": WEBHOOK_SECRET} if WEBHOOK_SECRET else {}),
             },
             timeout=30
         )
@@ -28,6 +28,7 @@ class SentinelSetup:
         self.backend_url = os.getenv("BACKEND_URL", "https://sentinel-o0yb.onrender.com")
         self.supabase_url = os.getenv("SUPABASE_URL", "")
         self.supabase_key = os.getenv("SUPABASE_KEY", "")
+        self.database_url = os.getenv("DATABASE_URL", "")
         self.telegram_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
         self.gemini_key = os.getenv("GEMINI_API_KEY", "")
         self.hf_token = os.getenv("HF_TOKEN", "")
@@ -45,6 +46,7 @@ class SentinelSetup:
         vars_to_check = {
             "SUPABASE_URL": self.supabase_url,
             "SUPABASE_KEY": self.supabase_key,
+            "DATABASE_URL": self.database_url,
             "TELEGRAM_BOT_TOKEN": self.telegram_token,
             "GEMINI_API_KEY": self.gemini_key,
             "HF_TOKEN (HuggingFace)": self.hf_token,